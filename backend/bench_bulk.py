@@ -0,0 +1,85 @@
+import argparse
+import json
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+
+from bench_load import local_server, raise_for_status
+
+# Compares receipt ingest throughput of POST /api/receipts (one request per receipt)
+# against POST /api/receipts/bulk with an NDJSON body, against a running server.
+#
+# The one-by-one posts exceed the default per-user rate limit, so run against a
+# server started with RATE_LIMIT_DEFAULT=off RATE_LIMIT_ROUTES= , or let
+# --start-server run one:
+#
+#   python bench_bulk.py --start-server --url http://localhost:8002
+
+
+def sample_receipt(i: int) -> dict:
+    return {
+        "retailer": f"Bench Store {i % 50}",
+        "date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "time": "12:00",
+        "items": [
+            {"name": "Organic Apples", "quantity": 2, "price": 8.99},
+            {"name": "Whole Grain Bread", "quantity": 1, "price": 4.50}
+        ],
+        "subtotal": 13.49,
+        "tax": 1.35,
+        "total": 14.84,
+        "category": "Groceries",
+    }
+
+
+def run(args) -> None:
+    session = requests.Session()
+    response = session.post(f"{args.url}/api/auth/register", json={
+        "email": f"bench_{uuid.uuid4().hex[:8]}@ecoreceipt.com",
+        "password": "benchpass123",
+        "name": "Bench User"
+    })
+    raise_for_status(response)
+    session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    started = time.perf_counter()
+    for i in range(args.single):
+        raise_for_status(session.post(f"{args.url}/api/receipts", json=sample_receipt(i)))
+    single_rate = args.single / (time.perf_counter() - started)
+
+    body = "\n".join(json.dumps(sample_receipt(i)) for i in range(args.bulk))
+    started = time.perf_counter()
+    response = session.post(
+        f"{args.url}/api/receipts/bulk",
+        params={"batch_size": args.batch_size},
+        data=body.encode(),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    raise_for_status(response)
+    bulk_rate = response.json()["inserted"] / (time.perf_counter() - started)
+
+    print(f"single: {single_rate:10.1f} receipts/s")
+    print(f"bulk:   {bulk_rate:10.1f} receipts/s (batch size {args.batch_size})")
+    print(f"speedup: {bulk_rate / single_rate:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single vs bulk receipt ingest")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--start-server", action="store_true",
+                        help="run server.py with rate limits off on the --url port for the benchmark")
+    parser.add_argument("--single", type=int, default=500, help="receipts posted one by one")
+    parser.add_argument("--bulk", type=int, default=20000, help="receipts posted in one bulk request")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.start_server:
+        with local_server(urlsplit(args.url).port or 80) as args.url:
+            run(args)
+    else:
+        run(args)
+
+if __name__ == "__main__":
+    main()
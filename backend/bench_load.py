@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import httpx
+
+# Load generator for a running server. Each virtual user registers its own
+# account, loads some receipts through the bulk endpoint, then loops over a
+# weighted mix of scenarios until the run ends. Latency percentiles and RPS are
+# reported per endpoint and can be written as JSON and compared with an earlier
+# run (--output / --baseline).
+#
+# The server's per-user and per-address rate limits would turn most of this
+# traffic into 429s, so point it at a server started with
+# RATE_LIMIT_DEFAULT=off RATE_LIMIT_ROUTES= , or let --start-server run one.
+#
+#   python bench_load.py --start-server --users 50 --duration 60 --output run.json
+#   python bench_load.py --start-server --users 50 --duration 60 --baseline run.json
+
+SCENARIOS = ("login", "dashboard", "list", "analytics", "create_delete")
+DEFAULT_MIX = "login=1,dashboard=4,list=3,analytics=2,create_delete=1"
+
+RETAILERS = ["Green Grocers", "EcoMart", "Fresh Foods", "Local Cafe", "Corner Pharmacy", "City Books"]
+CATEGORIES = ["Groceries", "Personal Care", "Dining", "Health", "Books"]
+ITEMS = ["Organic Apples", "Whole Grain Bread", "Almond Milk", "Bamboo Toothbrush", "Oat Milk Latte",
+         "Quinoa", "Vitamin C", "Paperback Novel", "Free Range Eggs", "Reusable Water Bottle"]
+
+
+RATE_LIMIT_HINT = "start the server with RATE_LIMIT_DEFAULT=off RATE_LIMIT_ROUTES= or use --start-server"
+
+
+class SetupRateLimited(Exception):
+    """The server refused account setup with 429"""
+
+
+def raise_for_status(response) -> None:
+    """raise_for_status() for httpx and requests responses, with a hint instead of a traceback on 429"""
+    if response.status_code == 429:
+        raise SystemExit(f"❌ Rate limited by the server: {RATE_LIMIT_HINT}")
+    response.raise_for_status()
+
+
+def wait_until_ready(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/api/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"❌ Server at {url} did not become ready in {timeout:.0f}s")
+
+
+@contextmanager
+def local_server(port: int, workers: int = 1):
+    """Run `python server.py` with rate limits off to measure raw capacity; stop it with SIGTERM (the graceful path)"""
+    url = f"http://localhost:{port}"
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "PORT": str(port),
+           "RATE_LIMIT_DEFAULT": "off", "RATE_LIMIT_ROUTES": ""}
+    server = subprocess.Popen([sys.executable, "server.py"], cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(url, timeout=60)
+        yield url
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario: {name.strip()} (choose from {', '.join(SCENARIOS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def sample_receipt(rng: random.Random) -> dict:
+    items = [{"name": name, "quantity": rng.randint(1, 3), "price": round(rng.uniform(1, 20), 2)}
+             for name in rng.sample(ITEMS, rng.randint(1, 4))]
+    subtotal = round(sum(item["price"] * item["quantity"] for item in items), 2)
+    tax = round(subtotal * 0.1, 2)
+    return {
+        "retailer": rng.choice(RETAILERS),
+        "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "time": f"{rng.randint(8, 21):02d}:{rng.randint(0, 59):02d}",
+        "items": items,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": round(subtotal + tax, 2),
+        "category": rng.choice(CATEGORIES),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, expected=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            if self.recording:
+                self.errors[name] += 1
+                self.statuses[name][type(e).__name__] += 1
+            return None
+        elapsed = (time.perf_counter() - started) * 1000
+        if self.recording:
+            self.latencies[name].append(elapsed)
+            self.statuses[name][str(response.status_code)] += 1
+            if response.status_code not in expected:
+                self.errors[name] += 1
+        return response
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            samples = self.latencies[name]
+            endpoints[name] = {
+                "count": len(samples),
+                "errors": self.errors[name],
+                "rps": round(len(samples) / duration, 2),
+                "p50_ms": round(statistics.median(samples), 2) if samples else None,
+                "p95_ms": round(percentile(samples, 95), 2) if samples else None,
+                "p99_ms": round(percentile(samples, 99), 2) if samples else None,
+                "max_ms": round(max(samples), 2) if samples else None,
+                "statuses": dict(self.statuses[name]),
+            }
+        return endpoints
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.email = f"load_{uuid.uuid4().hex[:12]}@ecoreceipt.com"
+        self.password = "loadtest123"
+        self.headers = {}
+
+    async def setup(self, receipts: int) -> None:
+        response = await self.client.post("/api/auth/register", json={
+            "email": self.email, "password": self.password, "name": "Load User"
+        })
+        if response.status_code == 429:
+            raise SetupRateLimited(f"Registration was rate limited: {RATE_LIMIT_HINT}")
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        if receipts:
+            body = "\n".join(json.dumps(sample_receipt(self.rng)) for _ in range(receipts))
+            response = await self.client.post(
+                "/api/receipts/bulk",
+                content=body.encode(),
+                headers={**self.headers, "Content-Type": "application/x-ndjson"}
+            )
+            response.raise_for_status()
+
+    async def login(self) -> None:
+        response = await self.recorder.request(
+            self.client, "POST /api/auth/login", "POST", "/api/auth/login",
+            json={"email": self.email, "password": self.password}
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def dashboard(self) -> None:
+        # What the frontend does on load
+        await self.recorder.request(self.client, "GET /api/dashboard", "GET", "/api/dashboard", headers=self.headers)
+
+    async def list(self) -> None:
+        response = await self.recorder.request(
+            self.client, "GET /api/receipts", "GET", "/api/receipts", headers=self.headers
+        )
+        if response is not None and response.status_code == 200 and response.json().get("next_cursor"):
+            await self.recorder.request(
+                self.client, "GET /api/receipts?cursor", "GET", "/api/receipts",
+                params={"cursor": response.json()["next_cursor"]}, headers=self.headers
+            )
+
+    async def analytics(self) -> None:
+        await self.recorder.request(
+            self.client, "GET /api/analytics/spending", "GET", "/api/analytics/spending",
+            params={"months": self.rng.choice([3, 6, 12])}, headers=self.headers
+        )
+
+    async def create_delete(self) -> None:
+        response = await self.recorder.request(
+            self.client, "POST /api/receipts", "POST", "/api/receipts",
+            json=sample_receipt(self.rng), headers=self.headers
+        )
+        if response is not None and response.status_code == 200:
+            await self.recorder.request(
+                self.client, "DELETE /api/receipts/{id}", "DELETE", f"/api/receipts/{response.json()['id']}",
+                headers=self.headers
+            )
+
+    async def run(self, mix: dict, stop_at: float, think_ms: float) -> None:
+        names, weights = list(mix), list(mix.values())
+        while time.monotonic() < stop_at:
+            await getattr(self, self.rng.choices(names, weights)[0])()
+            if think_ms:
+                await asyncio.sleep(self.rng.expovariate(1000 / think_ms))
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose p95 grew or RPS dropped by more than `tolerance` percent"""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before.get("p95_ms") or current["p95_ms"] is None:
+            continue
+        p95_change = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        rps_change = (current["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+        print(f"{name:<42} p95 {before['p95_ms']:8.2f} -> {current['p95_ms']:8.2f}ms ({p95_change:+6.1f}%)  "
+              f"rps {before['rps']:8.2f} -> {current['rps']:8.2f} ({rps_change:+6.1f}%)")
+        if p95_change > tolerance or rps_change < -tolerance:
+            regressions.append(name)
+    return regressions
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users * 3, max_keepalive_connections=args.users * 3)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        users = [VirtualUser(client, recorder, random.Random(args.seed + i)) for i in range(args.users)]
+        print(f"Setting up {args.users} user(s) with {args.receipts} receipt(s) each...")
+        await asyncio.gather(*(user.setup(args.receipts) for user in users))
+
+        if args.warmup:
+            print(f"Warming up for {args.warmup}s...")
+            stop_at = time.monotonic() + args.warmup
+            await asyncio.gather(*(user.run(mix, stop_at, args.think_ms) for user in users))
+
+        print(f"Running {args.duration}s at concurrency {args.users} ({args.mix})...")
+        recorder.recording = True
+        started = time.monotonic()
+        await asyncio.gather(*(user.run(mix, started + args.duration, args.think_ms) for user in users))
+        duration = time.monotonic() - started
+        recorder.recording = False
+
+    endpoints = recorder.summary(duration)
+    total = sum(endpoint["count"] for endpoint in endpoints.values())
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "config": {
+            "url": args.url,
+            "users": args.users,
+            "duration": args.duration,
+            "mix": args.mix,
+            "receipts": args.receipts,
+            "think_ms": args.think_ms,
+            "seed": args.seed,
+        },
+        "duration_s": round(duration, 2),
+        "total_requests": total,
+        "total_rps": round(total / duration, 2),
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a realistic request mix against a running server")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--start-server", action="store_true",
+                        help="run server.py with rate limits off on the --url port for the benchmark")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. login=1,dashboard=4")
+    parser.add_argument("--receipts", type=int, default=200, help="receipts loaded per virtual user")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between scenarios")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare with an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    try:
+        if args.start_server:
+            with local_server(urlsplit(args.url).port or 80) as args.url:
+                results = asyncio.run(run(args))
+        else:
+            results = asyncio.run(run(args))
+    except SetupRateLimited as e:
+        raise SystemExit(f"❌ {e}")
+
+    print(f"\n{'endpoint':<42} {'n':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, endpoint in results["endpoints"].items():
+        if endpoint["count"]:
+            print(f"{name:<42} {endpoint['count']:7d} {endpoint['errors']:5d} {endpoint['rps']:8.2f} "
+                  f"{endpoint['p50_ms']:8.2f} {endpoint['p95_ms']:8.2f} {endpoint['p99_ms']:8.2f}")
+        else:
+            print(f"{name:<42} {0:7d} {endpoint['errors']:5d}")
+    print(f"total: {results['total_requests']} requests, {results['total_rps']:.2f} req/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0f}%):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Regressed: {', '.join(regressions)}")
+            return 1
+        print("✅ No regressions")
+
+    errors = sum(endpoint["errors"] for endpoint in results["endpoints"].values())
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
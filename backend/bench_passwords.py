@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import time
+
+from passwords import PasswordHasher, build_context
+
+# Measures login throughput (password verifications per second) at each bcrypt cost,
+# plus the worst event loop stall seen meanwhile to confirm hashing stays off the loop.
+
+
+async def loop_lag_probe(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def bench_rounds(rounds: int, logins: int, concurrency: int, workers: int) -> dict:
+    hasher = PasswordHasher(context=build_context(rounds=rounds), workers=workers, queue_timeout=3600)
+    hashed = await hasher.hash("password123")
+    gate = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with gate:
+            valid, _ = await hasher.verify("password123", hashed)
+            assert valid
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await probe
+    hasher.shutdown()
+
+    return {
+        "rounds": rounds,
+        "logins_per_sec": logins / elapsed,
+        "ms_per_login": elapsed / logins * 1000 * min(concurrency, workers),
+        "max_loop_lag_ms": worst_lag * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark login throughput per bcrypt cost")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'logins/s':>10} {'ms/login':>10} {'max loop lag (ms)':>18}")
+    for rounds in args.rounds:
+        result = await bench_rounds(rounds, args.logins, args.concurrency, args.workers)
+        print(f"{result['rounds']:>6} {result['logins_per_sec']:>10.1f} "
+              f"{result['ms_per_login']:>10.1f} {result['max_loop_lag_ms']:>18.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+
+from bench_load import local_server, raise_for_status
+
+# Measures GET /api/receipts/search latency against a running server. Loads a
+# fresh user with synthetic receipts through the bulk endpoint, then replays a
+# mix of full-word and typeahead queries and checks p95 against a target.
+# "miss" queries are prefixes that match nothing: without an index on the
+# words they would scan the user's whole history.
+#
+# The default rate limits reject most of these sequential requests with 429,
+# so run against a server started with RATE_LIMIT_DEFAULT=off RATE_LIMIT_ROUTES= ,
+# or let --start-server run one:
+#
+#   python bench_search.py --start-server --url http://localhost:8002
+
+RETAILERS = ["Green Grocers", "EcoMart", "Fresh Foods", "Local Cafe", "Corner Pharmacy", "City Books"]
+CATEGORIES = ["Groceries", "Personal Care", "Dining", "Health", "Books"]
+ITEMS = ["Organic Apples", "Whole Grain Bread", "Almond Milk", "Bamboo Toothbrush", "Oat Milk Latte",
+         "Quinoa", "Vitamin C", "Paperback Novel", "Free Range Eggs", "Reusable Water Bottle"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(args) -> int:
+    rng = random.Random(args.seed)
+    session = requests.Session()
+    response = session.post(f"{args.url}/api/auth/register", json={
+        "email": f"bench_{uuid.uuid4().hex[:8]}@ecoreceipt.com",
+        "password": "benchpass123",
+        "name": "Bench User"
+    })
+    raise_for_status(response)
+    session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    lines = []
+    for i in range(args.receipts):
+        items = [{"name": name, "quantity": 1, "price": 4.99} for name in rng.sample(ITEMS, 3)]
+        lines.append(json.dumps({
+            "retailer": rng.choice(RETAILERS),
+            "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "time": "12:00",
+            "items": items,
+            "subtotal": 14.97,
+            "tax": 1.50,
+            "total": 16.47,
+            "category": rng.choice(CATEGORIES),
+        }))
+    raise_for_status(session.post(
+        f"{args.url}/api/receipts/bulk",
+        data="\n".join(lines).encode(),
+        headers={"Content-Type": "application/x-ndjson"}
+    ))
+
+    words = sorted({word.lower() for name in RETAILERS + CATEGORIES + ITEMS for word in name.split()})
+    latencies = {"full": [], "prefix": [], "miss": []}
+    for _ in range(args.queries):
+        word = rng.choice(words)
+        mode = rng.choice(list(latencies))
+        if mode == "full":
+            params = {"q": word}
+        elif mode == "prefix":
+            params = {"q": word[:rng.randint(2, max(2, len(word)))], "prefix": "true"}
+        else:
+            params = {"q": "zq" + "".join(rng.choice("xjkv") for _ in range(3)), "prefix": "true"}
+        started = time.perf_counter()
+        raise_for_status(session.get(f"{args.url}/api/receipts/search", params=params))
+        latencies[mode].append((time.perf_counter() - started) * 1000)
+
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    for mode, samples in [*latencies.items(), ("all", all_samples)]:
+        print(f"{mode:>6}: n={len(samples):5d} p50={statistics.median(samples):7.2f}ms "
+              f"p95={percentile(samples, 95):7.2f}ms p99={percentile(samples, 99):7.2f}ms")
+
+    p95 = percentile(all_samples, 95)
+    if p95 > args.target_p95_ms:
+        print(f"❌ p95 {p95:.2f}ms exceeds target {args.target_p95_ms:.2f}ms")
+        return 1
+    print(f"✅ p95 {p95:.2f}ms within target {args.target_p95_ms:.2f}ms")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark receipt search latency")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--start-server", action="store_true",
+                        help="run server.py with rate limits off on the --url port for the benchmark")
+    parser.add_argument("--receipts", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--target-p95-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.start_server:
+        with local_server(urlsplit(args.url).port or 80) as args.url:
+            return run(args)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
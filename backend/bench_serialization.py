@@ -0,0 +1,84 @@
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+
+from server import Receipt, ReceiptPage, receipt_json
+
+# Serialization cost per 1k receipts for GET /api/receipts:
+#   before: Receipt(**doc) per document, then FastAPI re-validates the response_model and json.dumps it
+#   after:  the DB documents, reshaped to the Receipt fields by receipt_json, go through orjson (FAST_JSON=1)
+# Both must produce the same JSON; the script checks that before timing.
+
+
+def sample_docs(count: int) -> List[dict]:
+    docs = [{
+        "id": str(uuid.uuid4()),
+        "user_id": "bench-user",
+        "retailer": "Green Grocers",
+        "logo": "https://placehold.co/50x50/4CAF50/FFFFFF?text=GG",
+        "date": "2025-01-15",
+        "time": "14:30",
+        "items": [
+            {"name": "Organic Apples", "quantity": 2, "price": 8.99},
+            {"name": "Whole Grain Bread", "quantity": 1, "price": 4.50},
+            {"name": "Free Range Eggs", "quantity": 1, "price": 6.99},
+            {"name": "Almond Milk", "quantity": 2, "price": 12.98}
+        ],
+        "subtotal": 33.46,
+        "tax": 3.35,
+        "total": 45.50,
+        "category": "Groceries",
+        "purchased_at": datetime(2025, 1, 15, 14, 30),
+        "created_at": datetime.utcnow()
+    } for _ in range(count)]
+    # Shapes the fast path has to normalize: no logo, integer amounts, keyed items, an image
+    docs[0].pop("logo")
+    docs[0]["subtotal"] = 33
+    docs[0]["items"][0]["key"] = "organic apples"
+    docs[0]["image"] = {"content_type": "image/png", "length": 10, "sha256": "0" * 64}
+    return docs
+
+
+def pydantic_path(docs: List[dict], adapter: TypeAdapter) -> bytes:
+    page = ReceiptPage(items=[Receipt(**doc) for doc in docs], next_cursor=None)
+    content = adapter.dump_python(adapter.validate_python(page), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def orjson_path(docs: List[dict], adapter: TypeAdapter) -> bytes:
+    return orjson.dumps({"items": [receipt_json(doc) for doc in docs], "next_cursor": None})
+
+
+def bench(fn, docs, adapter, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(docs, adapter)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark receipt response serialization")
+    parser.add_argument("--receipts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    docs = sample_docs(args.receipts)
+    adapter = TypeAdapter(ReceiptPage)
+    if orjson.loads(pydantic_path(docs, adapter)) != orjson.loads(orjson_path(docs, adapter)):
+        raise SystemExit("❌ FAST_JSON output differs from the Pydantic response")
+    per_1k = 1000 / args.receipts
+
+    before = bench(pydantic_path, docs, adapter, args.repeat) * per_1k * 1000
+    after = bench(orjson_path, docs, adapter, args.repeat) * per_1k * 1000
+    print(f"before (Pydantic + json): {before:8.2f} ms per 1k receipts")
+    print(f"after  (orjson, no model): {after:8.2f} ms per 1k receipts")
+    print(f"speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import json
+from argparse import Namespace
+
+from bench_load import DEFAULT_MIX, local_server, run
+
+# Measures throughput scaling with the number of server worker processes. For
+# each --workers value it starts `python server.py` with WEB_CONCURRENCY set and
+# rate limits off, replays the bench_load.py mix against it, and stops it with
+# SIGTERM (the graceful path). Needs a running mongod at MONGO_URL.
+#
+#   python bench_workers.py --workers 1,2,4 --users 64 --duration 30
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark throughput against the number of worker processes")
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--users", type=int, default=64, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--receipts", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for workers in [int(count) for count in args.workers.split(",")]:
+        with local_server(args.port, workers) as url:
+            print(f"\n=== {workers} worker(s) ===")
+            run_args = Namespace(
+                url=url, users=args.users, duration=args.duration, warmup=args.warmup, mix=args.mix,
+                receipts=args.receipts, think_ms=0, timeout=30, seed=args.seed
+            )
+            result = asyncio.run(run(run_args))
+
+        endpoints = result["endpoints"]
+        results.append({
+            "workers": workers,
+            "rps": result["total_rps"],
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "p95_ms": {name: endpoint["p95_ms"] for name, endpoint in endpoints.items()},
+        })
+
+    base = results[0]["rps"] or 1
+    print(f"\n{'workers':>7} {'req/s':>10} {'speedup':>8} {'errors':>7} {'dashboard p95':>14}")
+    for row in results:
+        dashboard = row["p95_ms"].get("GET /api/dashboard")
+        print(f"{row['workers']:7d} {row['rps']:10.2f} {row['rps'] / base:7.2f}x {row['errors']:7d} "
+              f"{dashboard if dashboard is not None else float('nan'):12.2f}ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
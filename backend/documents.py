@@ -0,0 +1,85 @@
+import re
+import unicodedata
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+# Builds receipt documents as stored in MongoDB. Derived fields are computed here
+# so the API, the bulk path, seed_data.py and migrations.py all agree on them.
+
+# Letters and digits in any script; underscore is a separator as it always was
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M%p")
+
+
+def fold(text: str) -> str:
+    """Casefold and strip accents, so "Café" and "CAFE" compare equal"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(fold(text))
+
+
+def search_terms(receipt: dict) -> List[str]:
+    """Distinct lowercase words from the retailer, category and item names"""
+    terms = set(tokenize(receipt["retailer"])) | set(tokenize(receipt["category"]))
+    for item in receipt.get("items", []):
+        terms.update(tokenize(item["name"]))
+    return sorted(terms)
+
+
+def item_key(name: str) -> str:
+    """Catalog key for an item name, so "Organic  Apples" and "organic apples" are one product.
+
+    A name without letters or digits ("***") keys on its folded text instead of
+    collapsing into an empty key shared with every other such name.
+    """
+    return " ".join(tokenize(name)) or " ".join(fold(name).split())
+
+
+def keyed_items(receipt: dict) -> List[dict]:
+    return [{**item, "key": item_key(item["name"])} for item in receipt.get("items", [])]
+
+
+def purchased_at(receipt: dict) -> Optional[datetime]:
+    """`date` and `time` combined into one sortable, range-queryable datetime.
+
+    Receipts carry the shop's wall-clock time without a zone, so this is stored
+    as a naive datetime like the rest of the documents. An unreadable time counts
+    as midnight; an unreadable date gives None.
+    """
+    try:
+        day = datetime.strptime(receipt["date"].strip(), "%Y-%m-%d")
+    except (KeyError, AttributeError, ValueError):
+        return None
+    for time_format in TIME_FORMATS:
+        try:
+            clock = datetime.strptime(str(receipt.get("time", "")).strip().upper(), time_format)
+        except ValueError:
+            continue
+        return day.replace(hour=clock.hour, minute=clock.minute, second=clock.second)
+    return day
+
+
+def derived_fields(receipt: dict) -> dict:
+    """Fields computed from a receipt's own data"""
+    return {
+        "search_terms": search_terms(receipt),
+        "purchased_at": purchased_at(receipt),
+        "items": keyed_items(receipt),
+    }
+
+
+def receipt_doc(user_id: str, fields: dict, receipt_id: Optional[str] = None,
+                created_at: Optional[datetime] = None) -> dict:
+    """Build a new receipt document from validated ReceiptCreate fields"""
+    doc = {
+        "id": receipt_id or str(uuid.uuid4()),
+        "user_id": user_id,
+        **fields,
+        "created_at": created_at or datetime.utcnow()
+    }
+    doc.update(derived_fields(doc))
+    return doc
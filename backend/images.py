@@ -0,0 +1,120 @@
+import hashlib
+import io
+import os
+from typing import AsyncIterator, Optional, Tuple
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+
+# Receipt scans stored in GridFS (bucket `receipt_images`). Uploads and downloads
+# move through the API in GridFS-chunk-sized pieces, never as whole files, and
+# receipt documents only keep a small reference to the file.
+
+IMAGE_BUCKET = "receipt_images"
+IMAGE_CHUNK_SIZE = int(os.getenv("IMAGE_CHUNK_SIZE", str(255 * 1024)))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class ImageTooLarge(Exception):
+    """Raised when an upload exceeds IMAGE_MAX_BYTES"""
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised for a byte range outside the file"""
+
+
+async def store_stream(bucket, chunks: AsyncIterator[bytes], filename: str, content_type: str,
+                       metadata: dict) -> dict:
+    """Write an upload to GridFS as it arrives; returns the reference kept on the receipt"""
+    grid_in = bucket.open_upload_stream(
+        filename,
+        chunk_size_bytes=IMAGE_CHUNK_SIZE,
+        metadata={**metadata, "content_type": content_type}
+    )
+    digest = hashlib.sha256()
+    length = 0
+    try:
+        async for chunk in chunks:
+            length += len(chunk)
+            if length > IMAGE_MAX_BYTES:
+                raise ImageTooLarge()
+            digest.update(chunk)
+            await grid_in.write(chunk)
+    except BaseException:
+        await grid_in.abort()
+        raise
+
+    await grid_in.set("sha256", digest.hexdigest())
+    await grid_in.close()
+    return {
+        "file_id": str(grid_in._id),
+        "content_type": content_type,
+        "length": length,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=` range into inclusive (start, end); None means send the whole file"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), length - 1) if end_text else length - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(0, length - suffix), length - 1
+    except ValueError:
+        return None
+    if start >= length or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+async def stream_file(bucket, file_id: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive) of a stored file, one GridFS chunk at a time"""
+    grid_out = await bucket.open_download_stream(ObjectId(file_id))
+    end = grid_out.length - 1 if end is None else end
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await grid_out.read(min(grid_out.chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+async def read_file(bucket, file_id: str) -> bytes:
+    return b"".join([chunk async for chunk in stream_file(bucket, file_id)])
+
+
+def make_thumbnail(image: bytes, size: int = THUMBNAIL_SIZE) -> bytes:
+    """Downscale to fit a size x size box, as JPEG. CPU bound; run it off the event loop"""
+    if Image is None:
+        raise RuntimeError("Thumbnails need Pillow installed")
+    with Image.open(io.BytesIO(image)) as picture:
+        picture.thumbnail((size, size))
+        output = io.BytesIO()
+        picture.convert("RGB").save(output, format="JPEG", quality=80)
+        return output.getvalue()
+
+
+async def delete_files(bucket, *file_ids: Optional[str]) -> None:
+    for file_id in file_ids:
+        if file_id:
+            try:
+                await bucket.delete(ObjectId(file_id))
+            except NoFile:
+                pass
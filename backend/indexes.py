@@ -0,0 +1,157 @@
+import os
+from datetime import datetime
+
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+
+OCR_JOB_TTL = int(os.getenv("OCR_JOB_TTL", str(24 * 60 * 60)))
+
+# Index registry: every index the API relies on, per collection.
+# startup reconciles the database against this list.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "receipts": [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], name="user_id_id", unique=True),
+        # Serves the keyset sort used by GET /api/receipts and from/to purchase ranges
+        IndexModel(
+            [("user_id", ASCENDING), ("purchased_at", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="user_id_purchased_at",
+        ),
+        # Ranked full-word search, scoped to one user
+        IndexModel(
+            [("user_id", ASCENDING), ("retailer", TEXT), ("category", TEXT), ("items.name", TEXT)],
+            name="user_id_text",
+            weights={"retailer": 10, "category": 5, "items.name": 1},
+        ),
+        # Prefix (typeahead) search over lowercase words: finds the matches of rare prefixes
+        IndexModel([("user_id", ASCENDING), ("search_terms", ASCENDING)], name="user_id_search_terms"),
+        # Price history of one catalog item
+        IndexModel([("user_id", ASCENDING), ("items.key", ASCENDING)], name="user_id_items_key"),
+    ],
+    "user_stats": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "ocr_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Finished jobs are only polled for a while; let MongoDB expire them
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=OCR_JOB_TTL),
+    ],
+    # Shared token buckets (RATE_LIMIT_BACKEND=mongo), looked up by _id
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Indexes we created in the past and no longer want
+RETIRED_INDEXES = {
+    # Listing sorted on the `date` string before purchased_at existed
+    "receipts": ["user_id_date"],
+}
+
+# Hot queries issued by server.py: (collection, filter, sort[, hint]).
+# Values are placeholders, only the shape matters to the planner.
+# A sorted query must also get its order from the index, not a blocking SORT.
+HOT_QUERIES = [
+    ("users", {"email": "probe@example.com"}, None),
+    ("users", {"id": "probe"}, None),
+    ("receipts", {"user_id": "probe", "id": "probe"}, None),
+    ("receipts", {"user_id": "probe"}, [("purchased_at", -1), ("created_at", -1), ("id", -1)]),
+    ("receipts", {"user_id": "probe", "purchased_at": {"$gte": datetime(2025, 1, 1), "$lt": datetime(2025, 2, 1)}},
+     [("purchased_at", -1), ("created_at", -1), ("id", -1)]),
+    ("receipts", {"user_id": "probe", "$text": {"$search": "probe"}}, None),
+    ("receipts", {"user_id": "probe", "$and": [{"search_terms": {"$regex": "^probe"}}]}, None, "user_id_search_terms"),
+    ("receipts", {"user_id": "probe", "$and": [{"search_terms": {"$regex": "^probe"}}]},
+     [("purchased_at", -1), ("created_at", -1), ("id", -1)], "user_id_purchased_at"),
+    ("receipts", {"user_id": "probe", "id": {"$in": ["probe"]}}, None),
+    ("receipts", {"user_id": "probe", "items.key": "probe"}, None),
+    ("user_stats", {"user_id": "probe"}, None),
+    ("ocr_jobs", {"id": "probe", "user_id": "probe"}, None),
+]
+
+
+class QueryPlanError(RuntimeError):
+    """Raised when a hot query is not served by an index"""
+
+
+def _normalize_key(key) -> tuple:
+    return tuple((field, direction if isinstance(direction, str) else int(direction)) for field, direction in key)
+
+
+def _index_spec(info: dict) -> tuple:
+    """Comparable (key, unique, weights, ttl) tuple for an index as reported by index_information()"""
+    weights = tuple(sorted(info["weights"].items())) if "weights" in info else None
+    return _normalize_key(info["key"]), bool(info.get("unique", False)), weights, info.get("expireAfterSeconds")
+
+
+def _model_spec(model: IndexModel) -> tuple:
+    """Same tuple for a registry entry; text fields are stored by MongoDB as _fts/_ftsx"""
+    document = model.document
+    key = _normalize_key(document["key"].items())
+    weights = None
+    text_fields = [field for field, direction in key if direction == TEXT]
+    if text_fields:
+        weights = tuple(sorted({field: document.get("weights", {}).get(field, 1) for field in text_fields}.items()))
+        first = next(i for i, (_, direction) in enumerate(key) if direction == TEXT)
+        rest = tuple(entry for entry in key[first:] if entry[1] != TEXT)
+        key = key[:first] + (("_fts", TEXT), ("_ftsx", 1)) + rest
+    return key, bool(document.get("unique", False)), weights, document.get("expireAfterSeconds")
+
+
+async def ensure_indexes(db) -> None:
+    """Create missing indexes and rebuild any whose definition has drifted"""
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        for name in RETIRED_INDEXES.get(collection_name, []):
+            if name in existing:
+                await collection.drop_index(name)
+                print(f"🗑️  Dropped retired index {collection_name}.{name}")
+
+        missing = []
+        for model in models:
+            name = model.document["name"]
+            if name in existing:
+                if _index_spec(existing[name]) == _model_spec(model):
+                    continue
+                await collection.drop_index(name)
+                print(f"♻️  Rebuilding index {collection_name}.{name} (definition changed)")
+            missing.append(model)
+
+        if missing:
+            await collection.create_indexes(missing)
+            print(f"✅ Created indexes on {collection_name}: {', '.join(m.document['name'] for m in missing)}")
+
+
+def _plan_stages(plan: dict):
+    """Yield every stage name in a (possibly nested) winning plan"""
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def verify_query_plans(db) -> None:
+    """Run explain() on every hot query and fail if any scans a whole collection or sorts in memory"""
+    failures = []
+    for collection_name, query, sort, *hint in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if hint:
+            cursor = cursor.hint(hint[0])
+        explain = await cursor.limit(1).explain()
+        stages = set(_plan_stages(explain["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            failures.append(f"{collection_name}.find({query}) sort={sort}: COLLSCAN")
+        elif sort and "SORT" in stages:
+            failures.append(f"{collection_name}.find({query}) sort={sort}: in-memory SORT")
+
+    if failures:
+        raise QueryPlanError("Hot queries are not served by an index: " + "; ".join(failures))
+    print(f"✅ Verified query plans for {len(HOT_QUERIES)} hot queries")
@@ -0,0 +1,291 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional
+
+from cache import TTLCache
+
+if TYPE_CHECKING:
+    from emergentintegrations.llm.chat import LlmChat
+
+# LLM providers behind the AI chat endpoints. LLM_PROVIDER picks one:
+#   emergent - the hosted model through emergentintegrations (needs EMERGENT_LLM_KEY)
+#   fake     - a local, deterministic stand-in for offline tests and latency measurements
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "emergent")
+LLM_MODEL_PROVIDER = os.getenv("LLM_MODEL_PROVIDER", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+FAKE_LLM_FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "200"))
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "20"))
+
+# Protection around upstream calls
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "1"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+SYSTEM_PROMPT = """You are an AI assistant for EcoReceipt, a digital receipt manager.
+        You help users understand their spending patterns and environmental impact.
+
+        Context about this user: {context}
+
+        Provide helpful insights about their spending, suggest ways to save money or be more eco-friendly.
+        Keep responses concise and friendly. Focus on actionable advice."""
+
+
+class LLMNotConfigured(Exception):
+    """Raised when the selected provider is missing its credentials"""
+
+
+class LLMUnavailable(Exception):
+    """The call was not attempted: breaker open or no free slot"""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout` seconds.
+
+    After that one trial call is let through (half-open); success closes the
+    breaker again, failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def is_open(self) -> bool:
+        """True while calls are rejected outright; does not claim the half-open trial"""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def cancel_trial(self) -> None:
+        """Free the half-open trial slot when a call ends without a verdict"""
+        self._trial_running = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class LLMGuard:
+    """Admission control for LLM calls: a concurrency cap, a hard deadline, a circuit breaker,
+    and coalescing of identical in-flight requests onto one upstream call."""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 timeout: float = LLM_TIMEOUT, breaker: Optional[CircuitBreaker] = None):
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.active = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.overloaded = 0
+
+    def circuit_open(self) -> bool:
+        """Check before doing work that only feeds an LLM call the breaker would reject"""
+        if self.breaker.is_open():
+            self.breaker.rejected += 1
+            return True
+        return False
+
+    async def _acquire(self) -> None:
+        if not self.breaker.allow():
+            raise LLMUnavailable("circuit open")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.overloaded += 1
+            self.breaker.cancel_trial()
+            raise LLMUnavailable("too many concurrent LLM calls")
+        self.active += 1
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._slots.release()
+
+    async def _guarded(self, call: Callable[[], Awaitable[str]]) -> str:
+        await self._acquire()
+        try:
+            result = await asyncio.wait_for(call(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._release()
+            self.breaker.cancel_trial()
+        self.breaker.record_success()
+        return result
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
+
+    async def complete(self, key: Hashable, call: Callable[[], Awaitable[str]]) -> str:
+        """Run `call` under the guard; concurrent calls with the same key share one result"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # A task of its own, so one waiter disconnecting does not cancel it for the others
+            task = asyncio.ensure_future(self._guarded(call))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    async def stream(self, pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Guard a streamed reply; the deadline covers the whole stream"""
+        await self._acquire()
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                try:
+                    piece = await asyncio.wait_for(pieces.__anext__(), timeout=max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                yield piece
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._release()
+            self.breaker.cancel_trial()
+            await pieces.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "inflight_keys": len(self._inflight),
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "overloaded": self.overloaded,
+        }
+
+
+class LLMProvider(ABC):
+    @abstractmethod
+    async def complete(self, session_key: str, context: str, message: str) -> str:
+        """Return the whole reply"""
+
+    async def stream(self, session_key: str, context: str, message: str) -> AsyncIterator[str]:
+        """Yield the reply in pieces as they become available"""
+        yield await self.complete(session_key, context, message)
+
+
+class EmergentProvider(LLMProvider):
+    """Hosted model via LlmChat; chat objects are reused per session while the context is unchanged"""
+
+    def __init__(self, api_key: str, sessions: TTLCache):
+        self.api_key = api_key
+        self.sessions = sessions
+
+    def chat_session(self, session_key: str, context: str) -> "LlmChat":
+        # Imported here so the fake provider and offline tests run without emergentintegrations
+        from emergentintegrations.llm.chat import LlmChat
+
+        cached = self.sessions.get(session_key)
+        if cached is not None and cached[0] == context:
+            return cached[1]
+
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=session_key,
+            system_message=SYSTEM_PROMPT.format(context=context)
+        ).with_model(LLM_MODEL_PROVIDER, LLM_MODEL)
+        self.sessions.set(session_key, (context, chat))
+        return chat
+
+    async def complete(self, session_key: str, context: str, message: str) -> str:
+        from emergentintegrations.llm.chat import UserMessage
+
+        chat = self.chat_session(session_key, context)
+        return await chat.send_message(UserMessage(text=message))
+
+    # LlmChat has no token streaming, so stream() yields the full reply as one piece
+
+
+class FakeLLMProvider(LLMProvider):
+    """Offline provider with a fixed time to first token and per-token delay"""
+
+    def __init__(self, first_token_ms: float = FAKE_LLM_FIRST_TOKEN_MS, token_ms: float = FAKE_LLM_TOKEN_MS):
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+
+    def reply(self, context: str, message: str) -> str:
+        summary = " ".join(line.strip() for line in context.strip().splitlines()[1:3])
+        return f"You asked: {message} Here is what I see in your data: {summary} Going digital keeps saving paper!"
+
+    async def stream(self, session_key: str, context: str, message: str) -> AsyncIterator[str]:
+        await asyncio.sleep(self.first_token_ms / 1000)
+        words = self.reply(context, message).split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_ms / 1000)
+            yield word if i == len(words) - 1 else word + " "
+
+    async def complete(self, session_key: str, context: str, message: str) -> str:
+        return "".join([piece async for piece in self.stream(session_key, context, message)])
+
+
+def get_llm_provider(sessions: TTLCache, provider: Optional[str] = None) -> LLMProvider:
+    provider = provider or LLM_PROVIDER
+    if provider == "fake":
+        return FakeLLMProvider()
+
+    api_key = os.getenv("EMERGENT_LLM_KEY")
+    if not api_key:
+        raise LLMNotConfigured("LLM service not configured")
+    return EmergentProvider(api_key, sessions)
@@ -0,0 +1,240 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# In-process metrics rendered in the Prometheus text format (GET /api/metrics).
+# Counters and histograms are updated from the event loop and from pymongo's
+# monitoring callbacks (driver threads), hence the lock. Component stats that
+# already exist elsewhere (caches, LLM guard, OCR queue) are pulled in at scrape
+# time through collectors instead of being duplicated here.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DOCUMENT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> [bucket counts..., sum, count]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        lines = self.header()
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # Called at scrape time; each returns [(name, type, help, [(labels dict, value), ...]), ...]
+        self.collectors: List[Callable[[], list]] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._add(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._add(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], list]) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status code")
+http_latency = registry.histogram("http_request_duration_seconds", "HTTP request latency by route, until the body is sent")
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+mongo_latency = registry.histogram("mongo_command_duration_seconds", "MongoDB command latency")
+mongo_failures = registry.counter("mongo_command_failures_total", "Failed MongoDB commands")
+mongo_documents = registry.histogram(
+    "mongo_command_documents_returned", "Documents returned per find/aggregate/getMore batch", DOCUMENT_BUCKETS
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight count per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            # Set by the router once a route matched; unmatched paths share one label
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_requests.inc(method=scope["method"], route=path, status=status[0])
+            http_latency.observe(time.perf_counter() - started, method=scope["method"], route=path)
+
+
+# Commands whose first argument is the collection name
+COLLECTION_COMMANDS = {
+    "find", "insert", "update", "delete", "aggregate", "count", "distinct", "findAndModify",
+    "createIndexes", "listIndexes", "dropIndexes", "create", "drop",
+}
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every driver command by collection and command name"""
+
+    def __init__(self):
+        self._pending: Dict[tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event) -> tuple:
+        return (event.connection_id, event.request_id, event.operation_id)
+
+    def started(self, event) -> None:
+        command = event.command
+        if event.command_name == "getMore":
+            collection = command.get("collection", "")
+        elif event.command_name in COLLECTION_COMMANDS:
+            collection = command.get(event.command_name, "")
+        else:
+            collection = ""
+        with self._lock:
+            self._pending[self._key(event)] = (str(collection), event.command_name)
+
+    def _finish(self, event) -> Tuple[str, str]:
+        with self._lock:
+            return self._pending.pop(self._key(event), ("", event.command_name))
+
+    def succeeded(self, event) -> None:
+        collection, command = self._finish(event)
+        mongo_latency.observe(event.duration_micros / 1e6, collection=collection, command=command)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+            mongo_documents.observe(len(batch), collection=collection, command=command)
+
+    def failed(self, event) -> None:
+        collection, command = self._finish(event)
+        mongo_latency.observe(event.duration_micros / 1e6, collection=collection, command=command)
+        mongo_failures.inc(collection=collection, command=command)
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Callable, Dict
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from documents import derived_fields
+
+# Resumable, batched data migrations. Each migration walks its collection in _id
+# order and records the last processed _id in the `migrations` collection, so an
+# interrupted run picks up where it stopped.
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+
+
+class Migration:
+    def __init__(self, name: str, collection: str, pending: dict, transform: Callable[[dict], dict]):
+        self.name = name
+        self.collection = collection
+        # Filter matching documents that still need the migration
+        self.pending = pending
+        # Returns the fields to $set on one document
+        self.transform = transform
+
+
+MIGRATIONS: Dict[str, Migration] = {
+    migration.name: migration for migration in [
+        Migration(
+            "receipt_search_terms",
+            "receipts",
+            {"search_terms": {"$exists": False}},
+            lambda receipt: {"search_terms": derived_fields(receipt)["search_terms"]},
+        ),
+        # Receipts whose date cannot be parsed get an explicit null, so they are not revisited
+        Migration(
+            "receipt_purchased_at",
+            "receipts",
+            {"purchased_at": {"$exists": False}},
+            lambda receipt: {"purchased_at": derived_fields(receipt)["purchased_at"]},
+        ),
+        Migration(
+            "receipt_item_keys",
+            "receipts",
+            {"items": {"$elemMatch": {"key": {"$exists": False}}}},
+            lambda receipt: {"items": derived_fields(receipt)["items"]},
+        ),
+        # Words and keys were once ASCII-only: "Café" gave "caf" and "Молоко" an empty key
+        Migration(
+            "receipt_unicode_tokens",
+            "receipts",
+            {"$or": [
+                {"retailer": {"$regex": "[^\\x00-\\x7f]"}},
+                {"category": {"$regex": "[^\\x00-\\x7f]"}},
+                {"items.name": {"$regex": "[^\\x00-\\x7f]"}},
+                {"items.key": ""},
+            ]},
+            lambda receipt: {key: value for key, value in derived_fields(receipt).items() if key != "purchased_at"},
+        ),
+    ]
+}
+
+
+async def run_migration(db, name: str, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """Run (or resume) a migration; returns the number of documents updated"""
+    migration = MIGRATIONS[name]
+    state = await db.migrations.find_one({"name": name}) or {}
+    if state.get("completed_at"):
+        return 0
+
+    collection = db[migration.collection]
+    last_id = state.get("last_id")
+    updated = 0
+    while True:
+        query = dict(migration.pending)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        await collection.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$set": migration.transform(doc)}) for doc in batch],
+            ordered=False
+        )
+        updated += len(batch)
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"name": name},
+            {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}, "$inc": {"processed": len(batch)}},
+            upsert=True
+        )
+
+    await db.migrations.update_one(
+        {"name": name},
+        {"$set": {"completed_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return updated
+
+
+async def pending_migrations(db) -> list:
+    done = {state["name"] async for state in db.migrations.find({"completed_at": {"$exists": True}}, {"name": 1})}
+    return [name for name in MIGRATIONS if name not in done]
+
+
+async def run_pending(db, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, int]:
+    results = {}
+    for name in await pending_migrations(db):
+        results[name] = await run_migration(db, name, batch_size)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run resumable data migrations")
+    parser.add_argument("names", nargs="*", help="migrations to run (default: all pending)")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="forget saved progress first")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "ecoreceipt")]
+
+    names = args.names or await pending_migrations(db)
+    for name in names:
+        if name not in MIGRATIONS:
+            print(f"❌ Unknown migration: {name}")
+            continue
+        if args.restart:
+            await db.migrations.delete_one({"name": name})
+        updated = await run_migration(db, name, args.batch_size)
+        print(f"✅ {name}: updated {updated} document(s)")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+# OCR job pipeline. Uploaded images are queued in a bounded asyncio queue and
+# processed in a ProcessPoolExecutor, so image decoding, OCR and parsing never
+# run on the event loop. Job state lives in the `ocr_jobs` collection so any
+# API process can answer status polls. Queued images are only held in memory:
+# jobs a process leaves behind at shutdown, or after a crash once they are
+# OCR_JOB_STALE seconds old, are marked failed so clients stop polling.
+#
+# OCR_ENGINE picks the text extractor:
+#   tesseract - Pillow + pytesseract (both optional installs)
+#   stub      - local stand-in: UTF-8 uploads are read as the receipt text,
+#               anything else gets a canned receipt. Used for offline tests.
+#   auto      - tesseract when available; otherwise jobs fail with an error,
+#               so a missing install never passes canned data off as OCR output
+
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+OCR_QUEUE_SIZE = int(os.getenv("OCR_QUEUE_SIZE", "32"))
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+OCR_JOB_STALE = int(os.getenv("OCR_JOB_STALE", "600"))
+
+PENDING = ["queued", "processing"]
+
+NO_ENGINE = "No OCR engine installed: install Pillow and pytesseract, or set OCR_ENGINE=stub"
+
+try:
+    from PIL import Image
+    import pytesseract
+except ImportError:
+    Image = None
+    pytesseract = None
+
+STUB_RECEIPT = """Digital Store
+2025-01-15 14:30
+Sample Item 1  1 x 15.99
+Sample Item 2  2 x 12.49
+Subtotal 40.97
+Tax 4.10
+Total 45.07
+"""
+
+CATEGORY_KEYWORDS = {
+    "Groceries": ["grocer", "market", "foods", "mart", "supermarket"],
+    "Dining": ["cafe", "coffee", "restaurant", "bistro", "pizza", "bar"],
+    "Personal Care": ["pharmacy", "beauty", "care", "salon"],
+    "Transport": ["fuel", "gas", "taxi", "transit", "parking"],
+}
+
+DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), lambda m: f"{m[1]}-{m[2]}-{m[3]}"),
+    (re.compile(r"\b(\d{2})/(\d{2})/(\d{4})\b"), lambda m: f"{m[3]}-{m[1]}-{m[2]}"),
+]
+TIME_PATTERN = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+AMOUNT_LINE = re.compile(r"^(subtotal|sub total|tax|vat|total)\b[^\d-]*(-?\d+[.,]\d{2})", re.IGNORECASE)
+ITEM_LINE = re.compile(r"^(?P<name>.*?[A-Za-z].*?)\s+(?:(?P<qty>\d+)\s*[xX@]\s*)?\$?(?P<price>\d+[.,]\d{2})$")
+
+
+class OCRQueueFull(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+def extract_text(image: bytes, engine: str = OCR_ENGINE) -> str:
+    if engine in ("tesseract", "auto"):
+        if pytesseract is None:
+            raise RuntimeError(NO_ENGINE)
+        with Image.open(io.BytesIO(image)) as picture:
+            return pytesseract.image_to_string(picture.convert("L"))
+    if engine != "stub":
+        raise ValueError(f"Unknown OCR_ENGINE {engine!r}; use auto, tesseract or stub")
+
+    try:
+        text = image.decode("utf-8")
+        if text.strip():
+            return text
+    except UnicodeDecodeError:
+        pass
+    return STUB_RECEIPT
+
+
+def _amount(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def parse_receipt_text(text: str) -> dict:
+    """Best-effort conversion of OCR text into ReceiptCreate fields"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    retailer = lines[0] if lines else "Unknown Retailer"
+
+    date = datetime.now().strftime("%Y-%m-%d")
+    for pattern, build in DATE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            date = build(match)
+            break
+    time_match = TIME_PATTERN.search(text)
+    time = f"{int(time_match[1]):02d}:{time_match[2]}" if time_match else datetime.now().strftime("%H:%M")
+
+    amounts, items = {}, []
+    for line in lines[1:]:
+        amount = AMOUNT_LINE.match(line)
+        if amount:
+            label = amount[1].lower().replace(" ", "")
+            amounts["tax" if label == "vat" else label] = _amount(amount[2])
+            continue
+        item = ITEM_LINE.match(line)
+        if item:
+            quantity = int(item["qty"] or 1)
+            items.append({"name": item["name"].strip(), "quantity": quantity, "price": _amount(item["price"])})
+
+    subtotal = amounts.get("subtotal", round(sum(item["price"] * item["quantity"] for item in items), 2))
+    tax = amounts.get("tax", 0.0)
+    total = amounts.get("total", round(subtotal + tax, 2))
+
+    lowered = retailer.lower()
+    category = next(
+        (name for name, keywords in CATEGORY_KEYWORDS.items() if any(keyword in lowered for keyword in keywords)),
+        "General"
+    )
+
+    return {
+        "retailer": retailer,
+        "date": date,
+        "time": time,
+        "items": items,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": total,
+        "category": category,
+        "logo": None,
+    }
+
+
+def process_image(image: bytes, engine: str = OCR_ENGINE) -> dict:
+    """Runs in a worker process"""
+    text = extract_text(image, engine)
+    return {
+        "text": text,
+        "parsed_receipt": parse_receipt_text(text),
+        "sha256": hashlib.sha256(image).hexdigest(),
+    }
+
+
+async def fail_pending(db, query: dict, error: str) -> int:
+    result = await db.ocr_jobs.update_many(
+        {**query, "status": {"$in": PENDING}},
+        {"$set": {"status": "failed", "error": error, "updated_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
+
+async def fail_stale_jobs(db, stale_after: float = OCR_JOB_STALE) -> None:
+    """Fail jobs left pending by a process that died without shutting down"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    failed = await fail_pending(db, {"updated_at": {"$lt": cutoff}}, "OCR job was lost; please upload again")
+    if failed:
+        print(f"⚠️  Marked {failed} stale OCR job(s) failed")
+
+
+class OCRJobQueue:
+    def __init__(self, workers: int = OCR_WORKERS, queue_size: int = OCR_QUEUE_SIZE, engine: str = OCR_ENGINE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.engine = engine
+        self.db = None
+        # Marks the jobs this process holds, so shutdown only fails its own
+        self.owner = str(uuid.uuid4())
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._dispatchers = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self, db) -> None:
+        self.db = db
+        if self.engine != "stub" and pytesseract is None:
+            print(f"⚠️  {NO_ENGINE}; OCR jobs will fail")
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Spawn rather than fork: the parent already runs an event loop and a Motor client
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self.db is not None:
+            try:
+                await fail_pending(self.db, {"owner": self.owner}, "Server restarted before the job finished; please upload again")
+            except Exception as e:
+                print(f"⚠️  Could not mark unfinished OCR jobs failed: {e}")
+
+    async def drain(self, timeout: float) -> None:
+        """Wait for queued jobs to finish; stop() fails whatever is left"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  {self._queue.qsize()} OCR job(s) left unprocessed at shutdown")
+
+    async def submit(self, user_id: str, image: bytes, filename: Optional[str]) -> str:
+        if self._queue is None:
+            raise RuntimeError("OCR queue is not running")
+        if self._queue.full():
+            self.rejected += 1
+            raise OCRQueueFull()
+
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        await self.db.ocr_jobs.insert_one({
+            "id": job_id,
+            "user_id": user_id,
+            "status": "queued",
+            "owner": self.owner,
+            "filename": filename,
+            "size": len(image),
+            "created_at": now,
+            "updated_at": now,
+        })
+        try:
+            self._queue.put_nowait((job_id, image))
+        except asyncio.QueueFull:
+            # Filled up while the job document was being written
+            await self.db.ocr_jobs.delete_one({"id": job_id})
+            self.rejected += 1
+            raise OCRQueueFull()
+        return job_id
+
+    async def _set_status(self, job_id: str, status: str, **fields) -> None:
+        await self.db.ocr_jobs.update_one(
+            {"id": job_id},
+            {"$set": {"status": status, "updated_at": datetime.utcnow(), **fields}}
+        )
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, image = await self._queue.get()
+            try:
+                await self._set_status(job_id, "processing")
+                try:
+                    result = await loop.run_in_executor(self._pool, process_image, image, self.engine)
+                except Exception as e:
+                    self.failed += 1
+                    await self._set_status(job_id, "failed", error=str(e))
+                else:
+                    await self._set_status(job_id, "done", result=result)
+                    self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the dispatcher alive if recording the outcome fails
+                print(f"❌ OCR job {job_id} could not be updated: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
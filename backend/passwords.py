@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Hashing settings
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")  # "bcrypt" or "argon2" (needs argon2-cffi)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))
+
+# passlib 1.7.4 looks for bcrypt.__about__, which bcrypt 4.1 removed, and logs the
+# failed lookup with a traceback on first use; hashing itself is unaffected
+logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
+
+# Hashes written before bcrypt: unsalted hex SHA-256
+LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout"""
+
+
+def build_context(scheme: str = PASSWORD_SCHEME, rounds: int = BCRYPT_ROUNDS) -> CryptContext:
+    # Any scheme other than the configured one is deprecated and gets rehashed on login
+    schemes = ["argon2", "bcrypt"] if scheme == "argon2" else ["bcrypt"]
+    return CryptContext(schemes=schemes, deprecated="auto", bcrypt__rounds=rounds)
+
+
+class PasswordHasher:
+    """Runs password hashing in a bounded thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL, so the pool hashes in parallel. At most `workers`
+    hashes run at once; callers beyond that wait up to `queue_timeout` seconds
+    and then get PasswordHasherBusy instead of piling up behind a login burst.
+    """
+
+    def __init__(self, context: Optional[CryptContext] = None, workers: int = PASSWORD_HASH_WORKERS,
+                 queue_timeout: float = PASSWORD_HASH_QUEUE_TIMEOUT):
+        self.context = context or build_context()
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(workers)
+
+    async def _run(self, fn, *args):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PasswordHasherBusy()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; returns (valid, new_hash) where new_hash is set when the stored hash should be upgraded"""
+        if LEGACY_SHA256.match(hashed):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            if not hmac.compare_digest(legacy, hashed):
+                return False, None
+            return True, await self.hash(password)
+
+        try:
+            return await self._run(self.context.verify_and_update, password, hashed)
+        except ValueError:
+            # Unrecognized hash format
+            return False, None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,345 @@
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from pymongo import monitoring
+
+# Opt-in diagnostics, both off by default and free when off:
+#
+# Request profiling (needs ADMIN_TOKEN). A request sent with `X-Admin-Token` and
+# `X-Profile: 1` (or `?profile=1`) is sampled by a background thread that reads
+# the event loop thread's stack every PROFILE_INTERVAL_MS. Samples are kept only
+# while the loop is running one of that request's tasks (the request task and
+# any task spawned under it); the rest of the time is recorded as waiting. The
+# profile is stored in memory as collapsed stacks, the input format of
+# flamegraph.pl and speedscope, and its id is returned in `X-Profile-Id`.
+#
+# Slow-query log (needs SLOW_QUERY_MS > 0). A pymongo CommandListener records
+# any command slower than the threshold with its filter shape; an explain()
+# summary of the query plan is fetched in the background and attached.
+#
+# Both are kept in the memory of the worker process that saw them. With
+# WEB_CONCURRENCY > 1 the admin endpoints answer for whichever worker serves
+# the poll (their `pid` says which), so a profile id can 404 on another
+# worker; profile against a single-worker instance.
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "64"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
+# Set for the duration of a profiled request; tasks spawned under it inherit it
+_active_profile: ContextVar[Optional["Profile"]] = ContextVar("active_profile", default=None)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def collapse(frame, max_depth: int = PROFILE_MAX_DEPTH) -> str:
+    """Render a stack root-first as `a;b;c`"""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Profile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.duration_ms = 0.0
+        self.status = None
+        self.samples = Counter()
+        self.tasks = weakref.WeakSet()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "pid": os.getpid(),
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": sum(self.samples.values()),
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class Sampler(threading.Thread):
+    """Samples the event loop thread's stack until stopped"""
+
+    def __init__(self, profile: Profile, loop: asyncio.AbstractEventLoop, loop_thread_id: int, interval: float):
+        super().__init__(name=f"profiler-{profile.id}", daemon=True)
+        self.profile = profile
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        root = f"{self.profile.method} {self.profile.path}"
+        while not self.stopped.wait(self.interval):
+            # Reading another loop's current task is a plain lookup, safe from this thread
+            task = asyncio.current_task(self.loop)
+            if task is not None and task in self.profile.tasks:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                self.profile.samples[f"{root};{collapse(frame)}"] += 1
+            elif task is None:
+                self.profile.samples[f"{root};(waiting on I/O)"] += 1
+            else:
+                self.profile.samples[f"{root};(other requests)"] += 1
+
+
+class ProfileStore:
+    def __init__(self, keep: int = PROFILE_KEEP):
+        self.keep = keep
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+
+    def add(self, profile: Profile) -> None:
+        self._profiles[profile.id] = profile
+        while len(self._profiles) > self.keep:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        return [profile.summary() for profile in reversed(self._profiles.values())]
+
+
+profiles = ProfileStore()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles admin requests asking for it; only installed when ADMIN_TOKEN is set"""
+
+    def __init__(self, app, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.interval = interval_ms / 1000
+        self._active = 0
+        self._previous_factory = None
+
+    def _task_factory(self, loop, coro, **kwargs):
+        """Tag tasks created under a profiled request, so the sampler counts them as its own"""
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.tasks.add(task)
+        return task
+
+    def _track_tasks(self, loop) -> None:
+        """Install the task factory while at least one profile is running"""
+        if self._active == 0:
+            self._previous_factory = loop.get_task_factory()
+            loop.set_task_factory(self._task_factory)
+        self._active += 1
+
+    def _untrack_tasks(self, loop) -> None:
+        self._active -= 1
+        if self._active == 0:
+            loop.set_task_factory(self._previous_factory)
+            self._previous_factory = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        profile = Profile(scope["method"], scope["path"])
+        profile.tasks.add(asyncio.current_task())
+        token = _active_profile.set(profile)
+        sampler = Sampler(profile, loop, threading.get_ident(), self.interval)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        self._track_tasks(loop)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stopped.set()
+            profile.duration_ms = (time.perf_counter() - started) * 1000
+            _active_profile.reset(token)
+            self._untrack_tasks(loop)
+            await loop.run_in_executor(None, sampler.join)
+            profiles.add(profile)
+
+    @staticmethod
+    def _wants_profile(scope) -> bool:
+        headers = dict(scope["headers"])
+        flagged = headers.get(b"x-profile") == b"1" or b"profile=1" in scope.get("query_string", b"").split(b"&")
+        if not flagged:
+            return False
+        token = headers.get(b"x-admin-token")
+        return is_admin(token.decode("latin-1") if token is not None else None)
+
+
+def filter_shape(value):
+    """Replace literal values with their type names, keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = filter_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+
+# command name -> how to get the query part of it
+QUERY_FIELDS = {
+    "find": lambda command: {"filter": command.get("filter", {})},
+    "aggregate": lambda command: {"pipeline": command.get("pipeline", [])},
+    "count": lambda command: {"filter": command.get("query", {})},
+    "distinct": lambda command: {"key": command.get("key"), "filter": command.get("query", {})},
+    "findAndModify": lambda command: {"filter": command.get("query", {})},
+    "update": lambda command: {"filter": command["updates"][0].get("q", {}) if command.get("updates") else {}},
+    "delete": lambda command: {"filter": command["deletes"][0].get("q", {}) if command.get("deletes") else {}},
+}
+# Session and routing fields the driver adds; explain() rejects or ignores them
+DRIVER_FIELDS = {"$db", "lsid", "$clusterTime", "txnNumber", "$readPreference", "readConcern", "writeConcern",
+                 "startTransaction", "autocommit", "apiVersion", "apiStrict", "apiDeprecationErrors"}
+
+
+def explainable(command_name: str, command: dict) -> dict:
+    explain = {key: value for key, value in command.items() if key not in DRIVER_FIELDS}
+    # Writes are explained for their first statement only
+    if command_name == "update" and explain.get("updates"):
+        explain["updates"] = explain["updates"][:1]
+    if command_name == "delete" and explain.get("deletes"):
+        explain["deletes"] = explain["deletes"][:1]
+    return explain
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_nodes(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_nodes(child)
+
+
+def plan_summary(explain: dict) -> dict:
+    """Winning plan stages and indexes from an explain() reply (find or aggregate)"""
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        for stage in explain.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    if planner is None:
+        return {"stages": [], "indexes": [], "collscan": False}
+    nodes = list(_plan_nodes(planner.get("winningPlan", {})))
+    stages = [node["stage"] for node in nodes if "stage" in node]
+    return {
+        "stages": stages,
+        "indexes": sorted({node["indexName"] for node in nodes if "indexName" in node}),
+        "collscan": "COLLSCAN" in stages,
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Keeps the latest Mongo commands slower than `threshold_ms`"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, size: int = SLOW_QUERY_LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self.entries = deque(maxlen=size)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.db = None
+        self.loop = None
+
+    def start(self, db) -> None:
+        """Enable background explain() of slow queries"""
+        self.db = db
+        self.loop = asyncio.get_running_loop()
+
+    @staticmethod
+    def _key(event) -> tuple:
+        return (event.connection_id, event.request_id, event.operation_id)
+
+    def started(self, event) -> None:
+        if event.command_name in QUERY_FIELDS:
+            with self._lock:
+                self._pending[self._key(event)] = (event.database_name, dict(event.command))
+
+    def succeeded(self, event) -> None:
+        with self._lock:
+            pending = self._pending.pop(self._key(event), None)
+        if pending is None or event.duration_micros / 1000 < self.threshold_ms:
+            return
+
+        database, command = pending
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "database": database,
+            "collection": command.get(event.command_name),
+            "command": event.command_name,
+            "duration_ms": round(event.duration_micros / 1000, 2),
+            "shape": filter_shape(QUERY_FIELDS[event.command_name](command)),
+            "plan": None,
+        }
+        if command.get("sort"):
+            entry["sort"] = dict(command["sort"])
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if cursor:
+            entry["documents"] = len(cursor.get("firstBatch", []))
+        self.entries.append(entry)
+        print(f"🐢 Slow {entry['command']} on {entry['collection']}: {entry['duration_ms']}ms {entry['shape']}")
+
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(self._explain(entry, database, explainable(event.command_name, command)))
+            )
+
+    def failed(self, event) -> None:
+        with self._lock:
+            self._pending.pop(self._key(event), None)
+
+    async def _explain(self, entry: dict, database: str, command: dict) -> None:
+        try:
+            reply = await self.db.client[database].command({"explain": command, "verbosity": "queryPlanner"})
+            entry["plan"] = plan_summary(reply)
+        except Exception as e:
+            entry["plan"] = {"error": str(e)}
+
+    def list(self) -> list:
+        return list(reversed(self.entries))
+
+
+slow_queries = SlowQueryLog()
@@ -0,0 +1,192 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+
+from metrics import registry
+
+# Token-bucket rate limits per subject (user id, or client address for the auth
+# routes) and route template. Limits are "rate:burst" - tokens refilled per
+# second and bucket size - with per-route overrides:
+#
+#   RATE_LIMIT_DEFAULT=20:40
+#   RATE_LIMIT_ROUTES=/api/ai/chat=0.2:5,/api/dashboard=2:10,/api/health=off
+#
+# RATE_LIMIT_BACKEND picks where bucket state lives:
+#   memory - per process; with WEB_CONCURRENCY workers each one enforces 1/N
+#            of every limit, which is exact only while the kernel spreads a
+#            client's connections evenly over the workers
+#   mongo  - the `rate_limits` collection, shared by all workers; one atomic
+#            update per request, evaluated with the database clock
+# Backend failures let requests through rather than failing them.
+#
+# Separately, MAX_IN_FLIGHT caps concurrent requests per process and answers
+# the excess with an immediate 503 instead of queueing it (0 disables).
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "20:40")
+RATE_LIMIT_ROUTES = os.getenv(
+    "RATE_LIMIT_ROUTES",
+    "/api/ai/chat=0.2:5,/api/ai/chat/stream=0.2:5,/api/analytics/spending=2:10,/api/dashboard=2:10,"
+    "/api/auth/login=0.2:10,/api/auth/register=0.05:3"
+)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "256"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+Limit = Tuple[float, float]
+
+rate_limited = registry.counter("http_requests_rate_limited_total", "Requests refused with 429 by route")
+rate_limit_errors = registry.counter("rate_limit_backend_errors_total", "Rate limit checks let through because the backend failed")
+requests_shed = registry.counter("http_requests_shed_total", "Requests refused with 503 over the in-flight cap")
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def parse_limit(text: str) -> Optional[Limit]:
+    text = text.strip()
+    if not text or text == "off":
+        return None
+    rate, _, burst = text.partition(":")
+    return float(rate), float(burst or rate)
+
+
+def parse_routes(text: str) -> Dict[str, Optional[Limit]]:
+    routes = {}
+    for part in text.split(","):
+        if part.strip():
+            route, _, limit = part.partition("=")
+            routes[route.strip()] = parse_limit(limit)
+    return routes
+
+
+class MemoryBackend:
+    """Buckets in a bounded LRU dict; state is lost on restart and not shared between workers,
+    so each of `workers` processes gets an equal share of the limit"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, workers: int = WEB_CONCURRENCY):
+        self.max_keys = max_keys
+        self.workers = max(1, workers)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 if allowed, otherwise seconds until enough tokens are back"""
+        rate, burst = rate / self.workers, max(cost, burst / self.workers)
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class MongoBackend:
+    """Buckets in MongoDB, refilled and spent in one atomic pipeline update"""
+
+    def __init__(self, db):
+        self.collection = db.rate_limits
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]}
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    # A bucket untouched until it would be full again carries no state; let the TTL index drop it
+                    "expires_at": {"$add": ["$$NOW", int(burst / rate * 1000) + 1000]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return 0.0 if bucket["allowed"] else (cost - bucket["tokens"]) / rate
+
+
+class RateLimiter:
+    def __init__(self, default: Optional[Limit] = None, routes: Optional[Dict[str, Optional[Limit]]] = None,
+                 backend=None):
+        self.default = default if default is not None else parse_limit(RATE_LIMIT_DEFAULT)
+        self.routes = routes if routes is not None else parse_routes(RATE_LIMIT_ROUTES)
+        self.backend = backend or MemoryBackend()
+
+    def use(self, backend) -> None:
+        self.backend = backend
+
+    def limit_for(self, route: str) -> Optional[Limit]:
+        return self.routes.get(route, self.default)
+
+    async def check(self, subject: str, route: str) -> None:
+        """Raise RateLimited when `subject` is over its budget for `route`"""
+        limit = self.limit_for(route)
+        if limit is None:
+            return
+        try:
+            wait = await self.backend.take(f"{subject}|{route}", *limit)
+        except Exception as e:
+            # Fail open: losing the limiter must not take the API down with it
+            rate_limit_errors.inc()
+            print(f"⚠️  Rate limit backend error: {e}")
+            return
+        if wait > 0:
+            rate_limited.inc(route=route)
+            raise RateLimited(wait)
+
+
+def build_backend(db, name: str = RATE_LIMIT_BACKEND):
+    if name == "mongo":
+        return MongoBackend(db)
+    return MemoryBackend()
+
+
+class InFlightLimitMiddleware:
+    """Answer requests beyond `max_in_flight` concurrent ones with 503 straight away, so a
+    backlog never builds up that every client would time out in"""
+
+    def __init__(self, app, max_in_flight: int = MAX_IN_FLIGHT, exempt: Tuple[str, ...] = ("/api/health", "/api/metrics")):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.exempt = exempt
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= self.max_in_flight:
+            requests_shed.inc()
+            response = JSONResponse(
+                {"detail": "Server overloaded, please retry"},
+                status_code=503,
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -1,21 +1,249 @@
+import argparse
 import asyncio
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
-from datetime import datetime
 import hashlib
+import math
+import os
+import random
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+from documents import derived_fields, receipt_doc
+from passwords import build_context
+from stats import apply_receipts, init_user_stats, receipts_delta
+
+# Seeds the demo user and, optionally, a synthetic dataset for performance work:
+#
+#   python seed_data.py                                   # demo user only
+#   python seed_data.py --users 1000 --heavy-users 3      # plus 1000 users, 3 with 100k receipts
+#   python seed_data.py --users 200 --no-clear --seed 7   # add to what is already there
+#
+# Output is deterministic for a given --seed (and --end-date): every user and
+# receipt chunk has its own RNG, so the worker count does not change the data.
 
 # MongoDB setup
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "ecoreceipt")
+
+SEED_PASSWORD = "password123"
+CHUNK_SIZE = 10000
+
+# category: (retailers, items as (name, low price, high price), typical hours, tax rate)
+CATALOG = {
+    "Groceries": (
+        ["Green Grocers", "Fresh Foods", "EcoMart", "Corner Market", "Harvest Co-op"],
+        [("Organic Apples", 3, 9), ("Whole Grain Bread", 3, 6), ("Free Range Eggs", 4, 8), ("Almond Milk", 3, 7),
+         ("Organic Salmon", 12, 25), ("Mixed Vegetables", 4, 13), ("Quinoa", 6, 11), ("Greek Yogurt", 2, 6),
+         ("Bananas", 1, 3), ("Olive Oil", 8, 18), ("Brown Rice", 3, 7), ("Oat Milk", 3, 6)],
+        (8, 21), 0.05,
+    ),
+    "Dining": (
+        ["Local Cafe", "Green Bistro", "Noodle House", "Pizza Verde", "Sunrise Bakery"],
+        [("Oat Milk Latte", 4, 6), ("Avocado Toast", 6, 12), ("Veggie Burger", 10, 16), ("Pasta Primavera", 12, 20),
+         ("Green Smoothie", 5, 9), ("Croissant", 2, 5), ("Soup of the Day", 5, 9)],
+        (7, 22), 0.08,
+    ),
+    "Personal Care": (
+        ["EcoMart", "Corner Pharmacy", "Pure Beauty"],
+        [("Bamboo Toothbrush Set", 8, 16), ("Organic Shampoo", 10, 20), ("Natural Deodorant", 6, 12),
+         ("Shea Butter Soap", 4, 9), ("Reusable Cotton Pads", 8, 15)],
+        (9, 20), 0.1,
+    ),
+    "Health": (
+        ["Corner Pharmacy", "City Health Store"],
+        [("Vitamin C", 8, 15), ("Vitamin D", 8, 15), ("Allergy Relief", 10, 20), ("First Aid Kit", 12, 25)],
+        (9, 19), 0.1,
+    ),
+    "Books": (
+        ["City Books", "Paper Trail"],
+        [("Paperback Novel", 9, 18), ("Cookbook", 18, 35), ("Notebook", 4, 12), ("Magazine", 5, 9)],
+        (10, 20), 0.0,
+    ),
+    "Transport": (
+        ["Metro Transit", "Green Fuel", "City Parking"],
+        [("Transit Pass", 2, 60), ("Fuel", 30, 80), ("Parking", 3, 25)],
+        (6, 22), 0.0,
+    ),
+    "Household": (
+        ["EcoMart", "Home & Planet"],
+        [("Reusable Water Bottle", 15, 30), ("Compostable Bags", 5, 12), ("Eco Detergent", 8, 16),
+         ("Beeswax Wraps", 10, 20), ("LED Bulb", 4, 10)],
+        (9, 20), 0.1,
+    ),
+}
+# Share of receipts per category
+CATEGORY_WEIGHTS = {
+    "Groceries": 40, "Dining": 25, "Personal Care": 8, "Health": 5, "Books": 4, "Transport": 12, "Household": 6,
+}
+# More shopping at the end of the week (Monday = 0)
+WEEKDAY_WEIGHTS = [0.8, 0.8, 0.9, 1.0, 1.3, 1.6, 1.2]
+
+
+def seeded_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def synthetic_user(seed: int, index: int, password_hash: str, created_at: datetime) -> dict:
+    rng = random.Random(f"{seed}:user:{index}")
+    return {
+        "id": seeded_uuid(rng),
+        "email": f"user{index}.s{seed}@seed.ecoreceipt.com",
+        "name": f"Seed User {index}",
+        "password": password_hash,
+        "created_at": created_at,
+    }
+
+
+def receipt_counts(args) -> list:
+    """Receipts per user: log-normal around --receipts-per-user, the first --heavy-users get --heavy-receipts"""
+    rng = random.Random(f"{args.seed}:counts")
+    mu = math.log(max(1, args.receipts_per_user)) - args.spread ** 2 / 2
+    counts = [max(0, int(rng.lognormvariate(mu, args.spread))) for _ in range(args.users)]
+    for index in range(min(args.heavy_users, args.users)):
+        counts[index] = args.heavy_receipts
+    return counts
+
+
+def random_day(rng: random.Random, end: date, days: int) -> date:
+    while True:
+        day = end - timedelta(days=rng.randrange(days))
+        if rng.random() * max(WEEKDAY_WEIGHTS) < WEEKDAY_WEIGHTS[day.weekday()]:
+            return day
+
+
+def synthetic_receipt(rng: random.Random, user_id: str, end: date, days: int) -> dict:
+    category = rng.choices(list(CATEGORY_WEIGHTS), list(CATEGORY_WEIGHTS.values()))[0]
+    retailers, catalog, (opens, closes), tax_rate = CATALOG[category]
+
+    items = []
+    for name, low, high in rng.sample(catalog, min(len(catalog), 1 + int(rng.expovariate(1 / 2.5)))):
+        items.append({"name": name, "quantity": rng.choices([1, 2, 3, 4], [70, 20, 7, 3])[0],
+                      "price": round(rng.uniform(low, high), 2)})
+    subtotal = round(sum(item["price"] * item["quantity"] for item in items), 2)
+    tax = round(subtotal * tax_rate, 2)
+
+    day = random_day(rng, end, days)
+    hour, minute = rng.randint(opens, closes - 1), rng.randrange(60)
+    fields = {
+        "retailer": rng.choice(retailers),
+        "logo": None,
+        "date": day.isoformat(),
+        "time": f"{hour:02d}:{minute:02d}",
+        "items": items,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": round(subtotal + tax, 2),
+        "category": category,
+    }
+    created_at = datetime(day.year, day.month, day.day, hour, minute, rng.randrange(60))
+    return receipt_doc(user_id, fields, receipt_id=seeded_uuid(rng), created_at=created_at)
+
 
-async def seed_database():
+def seed_chunk(mongo_url: str, db_name: str, seed: int, user_id: str, user_index: int, chunk: int, count: int,
+               end: date, days: int, batch_size: int) -> dict:
+    """Runs in a worker process: generate and insert one chunk of a user's receipts; returns its stats delta"""
+    rng = random.Random(f"{seed}:receipts:{user_index}:{chunk}")
+    client = MongoClient(mongo_url)
+    db = client[db_name]
+    delta = {}
+    try:
+        batch = []
+        for i in range(count):
+            batch.append(synthetic_receipt(rng, user_id, end, days))
+            if len(batch) >= batch_size or i == count - 1:
+                db.receipts.insert_many(batch, ordered=False)
+                for key, value in receipts_delta(batch).items():
+                    delta[key] = delta.get(key, 0) + value
+                batch = []
+    finally:
+        client.close()
+    return delta
+
+
+def stats_doc(user_id: str, delta: dict) -> dict:
+    """Turn an accumulated receipts_delta into a user_stats document"""
+    doc = {"user_id": user_id, "receipt_count": 0, "total_spent": 0.0, "categories": {}, "months": {}, "version": 0,
+           "updated_at": datetime.utcnow()}
+    for key, value in delta.items():
+        field, _, name = key.partition(".")
+        if name:
+            doc[field][name] = value
+        else:
+            doc[field] = value
+    return doc
+
+
+def seed_synthetic(args) -> None:
+    end = date.fromisoformat(args.end_date) if args.end_date else date.today()
+    counts = receipt_counts(args)
+    client = MongoClient(MONGO_URL)
+    db = client[DB_NAME]
+
+    # One bcrypt hash shared by every seeded user
+    password_hash = build_context().hash(SEED_PASSWORD)
+    created_at = datetime.combine(end - timedelta(days=args.days), datetime.min.time())
+    users = [synthetic_user(args.seed, index, password_hash, created_at) for index in range(args.users)]
+    if db.users.find_one({"email": users[0]["email"]}):
+        client.close()
+        raise SystemExit(f"❌ Users for seed {args.seed} already exist; pick another --seed or drop --no-clear")
+    for start in range(0, len(users), args.batch_size):
+        db.users.insert_many(users[start:start + args.batch_size], ordered=False)
+    client.close()
+    print(f"Created {len(users)} users (password: {SEED_PASSWORD}), {sum(counts)} receipts to generate")
+
+    # Heavy users are split into chunks so they spread across the workers too
+    work = [
+        (user["id"], index, chunk, min(CHUNK_SIZE, counts[index] - chunk * CHUNK_SIZE))
+        for index, user in enumerate(users)
+        for chunk in range(math.ceil(counts[index] / CHUNK_SIZE))
+    ]
+    work.sort(key=lambda unit: -unit[3])
+
+    started = time.perf_counter()
+    inserted = 0
+    deltas = {user["id"]: {} for user in users}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(seed_chunk, MONGO_URL, DB_NAME, args.seed, user_id, index, chunk, count,
+                        end, args.days, args.batch_size): user_id
+            for user_id, index, chunk, count in work
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            user_delta = deltas[futures[future]]
+            for key, value in future.result().items():
+                user_delta[key] = user_delta.get(key, 0) + value
+            inserted += future.result().get("receipt_count", 0)
+            if done % 50 == 0 or done == len(futures):
+                rate = inserted / (time.perf_counter() - started)
+                print(f"  {inserted}/{sum(counts)} receipts ({rate:.0f}/s)")
+
+    # Rollups from the chunk deltas, so analytics work without a rebuild
+    client = MongoClient(MONGO_URL)
+    stats = [stats_doc(user_id, delta) for user_id, delta in deltas.items()]
+    for start in range(0, len(stats), args.batch_size):
+        client[DB_NAME].user_stats.insert_many(stats[start:start + args.batch_size], ordered=False)
+    client.close()
+    print(f"Created {inserted} receipts and rollups in {time.perf_counter() - started:.1f}s")
+
+
+async def seed_database(clear: bool = True):
     client = AsyncIOMotorClient(MONGO_URL)
-    db = client.ecoreceipt
-    
+    db = client[DB_NAME]
+
     # Clear existing data
-    await db.users.delete_many({})
-    await db.receipts.delete_many({})
-    
+    if clear:
+        await db.users.delete_many({})
+        await db.receipts.delete_many({})
+        await db.user_stats.delete_many({})
+    elif await db.users.find_one({"email": "demo@ecoreceipt.com"}):
+        print("Demo user already exists")
+        client.close()
+        return
+
     # Create demo user
     user_id = str(uuid.uuid4())
     demo_user = {
@@ -25,10 +253,10 @@ async def seed_database():
         "password": hashlib.sha256("password123".encode()).hexdigest(),
         "created_at": datetime.utcnow()
     }
-    
+
     await db.users.insert_one(demo_user)
     print(f"Created demo user: {demo_user['email']} / password123")
-    
+
     # Create demo receipts
     demo_receipts = [
         {
@@ -104,14 +332,38 @@ async def seed_database():
             "created_at": datetime.utcnow()
         }
     ]
-    
+    for receipt in demo_receipts:
+        receipt.update(derived_fields(receipt))
+
     await db.receipts.insert_many(demo_receipts)
+    await init_user_stats(db, user_id)
+    await apply_receipts(db, user_id, demo_receipts)
     print(f"Created {len(demo_receipts)} demo receipts")
-    
+
     print("\nDemo data created successfully!")
     print("Login credentials: demo@ecoreceipt.com / password123")
-    
+
     client.close()
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the demo user and optional synthetic data")
+    parser.add_argument("--users", type=int, default=0, help="synthetic users to create")
+    parser.add_argument("--receipts-per-user", type=int, default=200, help="mean receipts per regular user")
+    parser.add_argument("--spread", type=float, default=1.0, help="log-normal sigma of receipts per user")
+    parser.add_argument("--heavy-users", type=int, default=0, help="users that get --heavy-receipts each")
+    parser.add_argument("--heavy-receipts", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=730, help="receipt dates span this many days")
+    parser.add_argument("--end-date", help="latest receipt date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per insert_many")
+    parser.add_argument("--no-clear", action="store_true", help="keep existing data")
+    args = parser.parse_args()
+
+    asyncio.run(seed_database(clear=not args.no_clear))
+    if args.users:
+        seed_synthetic(args)
+
 if __name__ == "__main__":
-    asyncio.run(seed_database())
\ No newline at end of file
+    main()
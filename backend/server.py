@@ -1,43 +1,138 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from contextlib import asynccontextmanager
 import jwt
-import hashlib
 import uuid
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+import base64
+import hashlib
+import re
+import csv
+import io
+import json
+import orjson
+import time
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo.errors import BulkWriteError
 import asyncio
 from dotenv import load_dotenv
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from indexes import ensure_indexes, verify_query_plans
+from cache import TTLCache
+from passwords import PasswordHasher, PasswordHasherBusy
+from documents import item_key, receipt_doc, tokenize
+from migrations import run_pending
+from images import (
+    IMAGE_BUCKET, ImageTooLarge, RangeNotSatisfiable,
+    delete_files, make_thumbnail, parse_range, read_file, store_stream, stream_file
+)
+from metrics import MetricsMiddleware, MongoCommandListener, http_in_flight, registry as metrics_registry
+from ratelimit import MAX_IN_FLIGHT, InFlightLimitMiddleware, RateLimited, RateLimiter, build_backend, retry_after_header
+from profiling import ADMIN_TOKEN, SLOW_QUERY_MS, ProfilingMiddleware, is_admin, profiles, slow_queries
+from ocr import OCR_MAX_UPLOAD_BYTES, OCRJobQueue, OCRQueueFull, fail_stale_jobs
+from llm import LLMGuard, LLMNotConfigured, get_llm_provider
+from stats import (
+    apply_receipts, bump_version, init_user_stats, get_user_stats, get_user_version, category_totals,
+    compute_user_stats, item_prices, top_items
+)
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-process setup and teardown; with several workers each one runs this with its own Mongo pool"""
+    global client, db
+    client = create_mongo_client()
+    db = client[DB_NAME]
+    await startup_event()
+    yield
+    await shutdown_event()
+
 # Initialize FastAPI app
-app = FastAPI(title="EcoReceipt API", description="Digital Receipt Manager API")
+app = FastAPI(title="EcoReceipt API", description="Digital Receipt Manager API", lifespan=lifespan)
 
-@app.on_event("startup")
 async def startup_event():
     """Initialize database collections and test connection"""
+    ocr_queue.start(db)
+    rate_limiter.use(build_backend(db))
+    if SLOW_QUERY_MS > 0:
+        slow_queries.start(db)
+    
     try:
         # Test database connection
         await client.admin.command('ping')
         print("✅ MongoDB connection successful")
         
-        # Ensure collections exist
-        collections = await db.list_collection_names()
-        if "users" not in collections:
-            await db.create_collection("users")
-        if "receipts" not in collections:
-            await db.create_collection("receipts")
-        print("✅ Database collections initialized")
+        # python server.py already did this once before starting the workers
+        if DB_PREPARED:
+            return
+        
+        await prepare_database()
+        
+        if AUTO_MIGRATE:
+            background_tasks.add(asyncio.create_task(run_startup_migrations()))
         
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
         # Don't exit, let the app start and handle errors gracefully
+        return
+    
+    # A hot query without an index is a deploy bug, refuse to start
+    if VERIFY_QUERY_PLANS:
+        await verify_query_plans(db)
+
+async def prepare_database():
+    """Collections, indexes and stale OCR jobs: work that should not run once per worker"""
+    # Ensure collections exist
+    collections = await db.list_collection_names()
+    if "users" not in collections:
+        await db.create_collection("users")
+    if "receipts" not in collections:
+        await db.create_collection("receipts")
+    print("✅ Database collections initialized")
+    
+    await ensure_indexes(db)
+    await fail_stale_jobs(db)
+
+async def shutdown_event():
+    """Let in-flight requests and queued OCR jobs finish, then release the pool"""
+    deadline = time.monotonic() + SHUTDOWN_DRAIN_TIMEOUT
+    while http_in_flight.value() > 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if http_in_flight.value() > 0:
+        print(f"⚠️  Shutting down with {http_in_flight.value():.0f} request(s) still in flight")
+    
+    await ocr_queue.drain(max(0.0, deadline - time.monotonic()))
+    await ocr_queue.stop()
+    
+    # Migrations save their progress and resume on the next start
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    
+    client.close()
+    print("✅ Shutdown complete")
+
+async def run_startup_migrations():
+    """Backfill derived fields in the background; progress is saved, so restarts resume"""
+    try:
+        for name, updated in (await run_pending(db)).items():
+            print(f"✅ Migration {name} finished ({updated} documents updated)")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+
+# Shed load past MAX_IN_FLIGHT concurrent requests with an immediate 503. Added before
+# CORS so CORS wraps it: browsers only show the 503 to the page if it has CORS headers
+if MAX_IN_FLIGHT > 0:
+    app.add_middleware(InFlightLimitMiddleware, max_in_flight=MAX_IN_FLIGHT)
 
 # CORS middleware
 app.add_middleware(
@@ -48,12 +143,136 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB setup
+# Admin-only request profiling; not installed at all without ADMIN_TOKEN
+if ADMIN_TOKEN:
+    app.add_middleware(ProfilingMiddleware)
+
+# Per-route latency, status and in-flight metrics (outermost, so CORS time counts too)
+app.add_middleware(MetricsMiddleware)
+
+# MongoDB setup. The client is created per process in the lifespan hook, so
+# every worker has its own pool: total connections = WEB_CONCURRENCY x MONGO_MAX_POOL_SIZE
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URL)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+# Timeouts in milliseconds; unset keeps the driver defaults
+MONGO_TIMEOUTS = {
+    option: int(os.environ[variable])
+    for option, variable in [
+        ("connectTimeoutMS", "MONGO_CONNECT_TIMEOUT_MS"),
+        ("serverSelectionTimeoutMS", "MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+        ("socketTimeoutMS", "MONGO_SOCKET_TIMEOUT_MS"),
+        ("waitQueueTimeoutMS", "MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        ("maxIdleTimeMS", "MONGO_MAX_IDLE_TIME_MS"),
+    ]
+    if os.getenv(variable)
+}
+# Wire compression, e.g. "zstd,snappy,zlib" (zstd and snappy need the zstandard / python-snappy packages)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+mongo_listener = MongoCommandListener()
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    options = dict(MONGO_TIMEOUTS)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return AsyncIOMotorClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        event_listeners=[mongo_listener] + ([slow_queries] if SLOW_QUERY_MS > 0 else []),
+        **options
+    )
+
 # Use database name from environment or default
 DB_NAME = os.getenv("DB_NAME", "ecoreceipt")
-db = client[DB_NAME]
+VERIFY_QUERY_PLANS = os.getenv("VERIFY_QUERY_PLANS", "1") == "1"
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+# Process settings: worker processes, and how long shutdown waits for in-flight work.
+# With WEB_CONCURRENCY > 1 anything kept in process memory is per worker:
+# /api/metrics, /api/cache/stats, /api/ai/metrics, profiles and the slow-query
+# log describe the worker that answered, and the memory rate-limit backend
+# counts each worker separately (use RATE_LIMIT_BACKEND=mongo).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Reverse proxies whose X-Forwarded-For/-Proto uvicorn trusts, so request.client is
+# the real client (per-address rate limits key on it). Comma separated, or "*"
+# when only the proxy can reach the port.
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Set by `python server.py` for its workers once it has prepared the database itself
+DB_PREPARED = os.getenv("DB_PREPARED") == "1"
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+
+# Startup tasks cancelled on shutdown
+background_tasks = set()
+
+# Pagination settings
+RECEIPTS_PAGE_SIZE = int(os.getenv("RECEIPTS_PAGE_SIZE", "50"))
+RECEIPTS_MAX_PAGE_SIZE = int(os.getenv("RECEIPTS_MAX_PAGE_SIZE", "200"))
+
+# Receipts are listed by purchase time, newest first; id breaks ties so the order is total
+RECEIPT_SORT = [("purchased_at", -1), ("created_at", -1), ("id", -1)]
+# The index that serves RECEIPT_SORT (see indexes.py)
+RECEIPT_SORT_INDEX = "user_id_purchased_at"
+# The index that finds prefix-search matches (see indexes.py)
+SEARCH_TERMS_INDEX = "user_id_search_terms"
+
+
+def receipt_sort_key(receipt: dict) -> tuple:
+    """RECEIPT_SORT in Python (use reverse=True); undated receipts sort last, as in MongoDB"""
+    purchased_at = receipt.get("purchased_at")
+    return purchased_at is not None, purchased_at or datetime.min, receipt["created_at"], receipt["id"]
+
+
+# Fields returned for receipts: drop _id and internal fields at the query
+RECEIPT_PROJECTION = {
+    "_id": 0, "search_terms": 0, "image.file_id": 0, "image.thumbnail_id": 0, "image.thumbnail_length": 0
+}
+
+# Serve receipt lists straight from DB documents via orjson, skipping Pydantic
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+
+# Bulk ingest settings
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_BATCH_SIZE = int(os.getenv("BULK_MAX_BATCH_SIZE", "5000"))
+BULK_MAX_RECORDS = int(os.getenv("BULK_MAX_RECORDS", "100000"))
+# A JSON array body is read whole; NDJSON is streamed but no single line may exceed this
+BULK_MAX_BODY_BYTES = int(os.getenv("BULK_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", str(1024 * 1024)))
+
+# Search settings
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS", "8"))
+# Prefix matches up to this many are collected via the search_terms index and ordered in memory
+SEARCH_PREFIX_CANDIDATES = int(os.getenv("SEARCH_PREFIX_CANDIDATES", "1000"))
+
+# Export settings
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CSV_COLUMNS = [
+    "receipt_id", "retailer", "date", "time", "category", "subtotal", "tax", "total",
+    "item_name", "item_quantity", "item_price"
+]
+
+# Analytics settings
+ANALYTICS_MONTHS = int(os.getenv("ANALYTICS_MONTHS", "6"))
+ANALYTICS_MAX_MONTHS = int(os.getenv("ANALYTICS_MAX_MONTHS", "24"))
+TOP_ITEMS_LIMIT = int(os.getenv("TOP_ITEMS_LIMIT", "10"))
+TOP_ITEMS_MAX_LIMIT = int(os.getenv("TOP_ITEMS_MAX_LIMIT", "100"))
+ITEM_HISTORY_LIMIT = int(os.getenv("ITEM_HISTORY_LIMIT", "100"))
+ITEM_HISTORY_MAX_LIMIT = int(os.getenv("ITEM_HISTORY_MAX_LIMIT", "1000"))
+ITEM_STATS_CACHE_SIZE = int(os.getenv("ITEM_STATS_CACHE_SIZE", "10000"))
+ITEM_STATS_TTL = float(os.getenv("ITEM_STATS_TTL", "600"))
+# Distinct parameter sets kept per user
+ITEM_STATS_MAX_QUERIES = int(os.getenv("ITEM_STATS_MAX_QUERIES", "32"))
+
+# AI chat settings
+AI_CONTEXT_CACHE_SIZE = int(os.getenv("AI_CONTEXT_CACHE_SIZE", "10000"))
+AI_CONTEXT_TTL = float(os.getenv("AI_CONTEXT_TTL", "300"))
+AI_SESSION_CACHE_SIZE = int(os.getenv("AI_SESSION_CACHE_SIZE", "1000"))
+AI_SESSION_TTL = float(os.getenv("AI_SESSION_TTL", "1800"))
+AI_CONTEXT_MAX_CATEGORIES = int(os.getenv("AI_CONTEXT_MAX_CATEGORIES", "10"))
+AI_CONTEXT_MAX_CHARS = int(os.getenv("AI_CONTEXT_MAX_CHARS", "2000"))
 
 # JWT settings
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
@@ -62,6 +281,29 @@ JWT_ALGORITHM = "HS256"
 # Security
 security = HTTPBearer()
 
+# Auth caches: decoded tokens (token -> user id) and users (user id -> User).
+# No route changes id/email/name yet; one that does must user_cache.invalidate(user_id).
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+# AI chat caches: spending context per user, chat sessions per session id
+chat_context_cache = TTLCache(maxsize=AI_CONTEXT_CACHE_SIZE, ttl=AI_CONTEXT_TTL)
+chat_session_cache = TTLCache(maxsize=AI_SESSION_CACHE_SIZE, ttl=AI_SESSION_TTL)
+
+# Item analytics per user: {"version": data version, "results": {params: result}}
+item_stats_cache = TTLCache(maxsize=ITEM_STATS_CACHE_SIZE, ttl=ITEM_STATS_TTL)
+
+# Concurrency cap, deadline and circuit breaker shared by all LLM calls
+llm_guard = LLMGuard()
+
+# OCR jobs run in a process pool fed by a bounded queue
+ocr_queue = OCRJobQueue()
+
+# Token buckets per user and route (RATE_LIMIT_*); the backend is picked at startup
+rate_limiter = RateLimiter()
+
 # Pydantic models
 class UserCreate(BaseModel):
     email: str
@@ -82,6 +324,15 @@ class ReceiptItem(BaseModel):
     name: str
     quantity: int
     price: float
+    # Catalog key derived from the name at write time
+    key: Optional[str] = None
+    
+    @field_validator("name")
+    @classmethod
+    def check_name(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("must not be empty")
+        return value
 
 class ReceiptCreate(BaseModel):
     retailer: str
@@ -93,6 +344,28 @@ class ReceiptCreate(BaseModel):
     total: float
     category: str
     logo: Optional[str] = None
+    
+    # Both end up as field names in the user's rollup, so they must be well-formed
+    @field_validator("date")
+    @classmethod
+    def check_date(cls, value: str) -> str:
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError("must be a date in YYYY-MM-DD format")
+        return value
+    
+    @field_validator("category")
+    @classmethod
+    def check_category(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("must not be empty")
+        return value
+
+class ReceiptImage(BaseModel):
+    content_type: str
+    length: int
+    sha256: str
 
 class Receipt(BaseModel):
     id: str
@@ -106,8 +379,14 @@ class Receipt(BaseModel):
     total: float
     category: str
     logo: Optional[str] = None
+    image: Optional[ReceiptImage] = None
+    purchased_at: Optional[datetime] = None
     created_at: datetime
 
+class ReceiptPage(BaseModel):
+    items: List[Receipt]
+    next_cursor: Optional[str] = None
+
 class EnvironmentalImpact(BaseModel):
     trees_saved: float
     water_saved: float
@@ -118,15 +397,95 @@ class SpendingAnalytics(BaseModel):
     category_breakdown: Dict[str, float]
     monthly_spending: List[Dict[str, Any]]
 
+class Dashboard(BaseModel):
+    receipts: ReceiptPage
+    environmental_impact: EnvironmentalImpact
+    spending: SpendingAnalytics
+
+class TopItem(BaseModel):
+    key: str
+    name: str
+    spend: float
+    quantity: int
+    purchases: int
+    retailers: List[str]
+
+class TopItems(BaseModel):
+    by: str
+    items: List[TopItem]
+
+class ItemPurchase(BaseModel):
+    purchased_at: Optional[datetime] = None
+    date: str
+    retailer: str
+    name: str
+    price: float
+    quantity: int
+
+class RetailerPrice(BaseModel):
+    retailer: str
+    purchases: int
+    min_price: float
+    max_price: float
+    avg_price: float
+    last_price: float
+
+class ItemPriceHistory(BaseModel):
+    key: str
+    name: str
+    history: List[ItemPurchase]
+    retailers: List[RetailerPrice]
+
+def _fields(model, doc: dict) -> dict:
+    """`doc` reduced to the model's fields in model order, missing ones as None"""
+    return {field: doc.get(field) for field in model.model_fields}
+
+def receipt_json(doc: dict) -> dict:
+    """A receipt document shaped exactly like Receipt serializes, for the FAST_JSON paths"""
+    receipt = _fields(Receipt, doc)
+    receipt["items"] = [
+        {**_fields(ReceiptItem, item), "quantity": int(item["quantity"]), "price": float(item["price"])}
+        for item in doc["items"]
+    ]
+    for field in ("subtotal", "tax", "total"):
+        receipt[field] = float(receipt[field])
+    if receipt["image"] is not None:
+        receipt["image"] = _fields(ReceiptImage, receipt["image"])
+    return receipt
+
+class SearchResults(BaseModel):
+    items: List[Receipt]
+    page: int
+    has_more: bool
+    # Prefix searches page by cursor, like GET /api/receipts
+    next_cursor: Optional[str] = None
+
+class BulkIngestResult(BaseModel):
+    inserted: int
+    failed: int
+    # The stream went past BULK_MAX_RECORDS; records from that point on were not read
+    truncated: bool = False
+    results: List[Dict[str, Any]]
+
 class AIQuery(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
 # Utility functions
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+password_hasher = PasswordHasher()
 
-def verify_password(password: str, hashed: str) -> bool:
-    return hash_password(password) == hashed
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+async def verify_password(password: str, hashed: str) -> tuple:
+    """Returns (valid, new_hash); new_hash is set when the stored hash needs upgrading"""
+    try:
+        return await password_hasher.verify(password, hashed)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -135,19 +494,136 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def encode_cursor(receipt: dict) -> str:
+    """Build an opaque cursor pointing just past the given receipt"""
+    purchased_at = receipt.get("purchased_at")
+    raw = json.dumps([
+        purchased_at.isoformat() if purchased_at else None, receipt["created_at"].isoformat(), receipt["id"]
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        purchased_at, created_at, receipt_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        purchased_at = datetime.fromisoformat(purchased_at) if purchased_at else None
+        return purchased_at, datetime.fromisoformat(created_at), receipt_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def cursor_filter(cursor: str) -> dict:
+    """Keyset condition selecting receipts that sort after the cursor position"""
+    purchased_at, created_at, receipt_id = decode_cursor(cursor)
+    if purchased_at is None:
+        return {"$or": [
+            {"purchased_at": None, "created_at": {"$lt": created_at}},
+            {"purchased_at": None, "created_at": created_at, "id": {"$lt": receipt_id}},
+        ]}
+    return {"$or": [
+        {"purchased_at": {"$lt": purchased_at}},
+        {"purchased_at": purchased_at, "created_at": {"$lt": created_at}},
+        {"purchased_at": purchased_at, "created_at": created_at, "id": {"$lt": receipt_id}},
+        # Undated receipts (unreadable date, or not migrated yet) sort after all dated ones
+        {"purchased_at": None},
+    ]}
+
+def month_window(months: int, now: Optional[datetime] = None) -> List[str]:
+    """Return the last `months` calendar months as "YYYY-MM", oldest first"""
+    now = now or datetime.utcnow()
+    year, month = now.year, now.month
+    periods = []
+    for _ in range(months):
+        periods.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return periods[::-1]
+
+def month_span(first: str, last: str) -> List[str]:
+    """Every "YYYY-MM" from `first` to `last` inclusive"""
+    year, month = int(first[:4]), int(first[5:7])
+    periods = []
+    while f"{year:04d}-{month:02d}" <= last:
+        periods.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return periods
+
+def new_receipt_doc(user_id: str, receipt_data: ReceiptCreate) -> dict:
+    return receipt_doc(user_id, receipt_data.dict())
+
+def parse_day(value: Optional[str], name: str) -> Optional[str]:
+    """Validate a YYYY-MM-DD query parameter"""
+    if value is None:
+        return None
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be a date in YYYY-MM-DD format")
+    return value
+
+def purchase_range(date_from: Optional[str], date_to: Optional[str]) -> dict:
+    """`from`/`to` days (both inclusive) as a purchased_at condition; empty when neither is given"""
+    condition = {}
+    if parse_day(date_from, "from"):
+        condition["$gte"] = datetime.strptime(date_from, "%Y-%m-%d")
+    if parse_day(date_to, "to"):
+        condition["$lt"] = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+    return condition
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in error.errors())
+
+async def receipts_changed(user_id: str, receipts: List[dict], sign: int = 1):
+    """Keep derived per-user data in step with receipt inserts (sign=1) and deletes (sign=-1).
+
+    Runs after the receipts are written, so it must not fail the request: a rollup
+    left behind is reported here and fixed by `python stats.py`.
+    """
+    try:
+        await apply_receipts(db, user_id, receipts, sign)
+    except Exception as e:
+        print(f"❌ Rollup for {user_id} is out of date ({e}); run stats.py to repair it")
+    chat_context_cache.invalidate(user_id)
+    item_stats_cache.invalidate(user_id)
+
+async def enforce_rate_limit(request: Request, subject: str):
+    """429 once `subject` has spent its token bucket for the matched route"""
+    route = request.scope.get("route")
+    try:
+        await rate_limiter.check(subject, route.path if route is not None else request.url.path)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": retry_after_header(e.retry_after)}
+        )
+
+async def limit_by_client(request: Request):
+    """Rate limit unauthenticated routes by client address (the forwarded one behind a trusted proxy)"""
+    await enforce_rate_limit(request, f"ip:{request.client.host if request.client else 'unknown'}")
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
+        user_id = token_cache.get(token)
         if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Invalid token")
+            # Never keep a token cached past its expiry
+            token_ttl = min(AUTH_CACHE_TTL, payload["exp"] - time.time())
+            token_cache.set(token, user_id, ttl=token_ttl)
         
-        user = await db.users.find_one({"id": user_id})
+        user = user_cache.get(user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+            if user_doc is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            user = User(**user_doc)
+            user_cache.set(user_id, user)
         
-        return User(**user)
+        await enforce_rate_limit(request, f"user:{user_id}")
+        return user
+    except HTTPException:
+        raise
     except jwt.PyJWTError as e:
         print(f"JWT Error: {e}")
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -161,7 +637,71 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 async def health_check():
     return {"status": "healthy", "message": "EcoReceipt API is running"}
 
-@app.post("/api/auth/register")
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats(),
+        "chat_contexts": chat_context_cache.stats(),
+        "chat_sessions": chat_session_cache.stats(),
+        "item_stats": item_stats_cache.stats()
+    }
+
+def component_metrics() -> list:
+    """Cache, LLM guard and OCR queue stats for /api/metrics"""
+    caches = {
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats(),
+        "chat_contexts": chat_context_cache.stats(),
+        "chat_sessions": chat_session_cache.stats(),
+        "item_stats": item_stats_cache.stats()
+    }
+    llm = llm_guard.stats()
+    ocr = ocr_queue.stats()
+    breaker_states = {"closed": 0, "half_open": 1, "open": 2}
+    return [
+        ("cache_entries", "gauge", "Entries per cache", [({"cache": name}, stats["size"]) for name, stats in caches.items()]),
+        ("cache_hits_total", "counter", "Cache hits", [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("cache_misses_total", "counter", "Cache misses", [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("cache_evictions_total", "counter", "Cache evictions", [({"cache": name}, stats["evictions"]) for name, stats in caches.items()]),
+        ("llm_breaker_state", "gauge", "LLM circuit breaker: 0 closed, 1 half open, 2 open", [({}, breaker_states[llm["breaker"]["state"]])]),
+        ("llm_breaker_trips_total", "counter", "Times the LLM breaker opened", [({}, llm["breaker"]["trips"])]),
+        ("llm_rejected_total", "counter", "LLM calls refused", [({"reason": "breaker_open"}, llm["breaker"]["rejected"]), ({"reason": "overloaded"}, llm["overloaded"])]),
+        ("llm_active_calls", "gauge", "LLM calls in progress", [({}, llm["active"])]),
+        ("llm_coalesced_total", "counter", "LLM requests answered by an identical in-flight call", [({}, llm["coalesced"])]),
+        ("llm_timeouts_total", "counter", "LLM calls that hit the deadline", [({}, llm["timeouts"])]),
+        ("ocr_jobs_queued", "gauge", "OCR jobs waiting for a worker", [({}, ocr["queued"])]),
+        ("ocr_jobs_total", "counter", "Finished or rejected OCR jobs", [({"outcome": outcome}, ocr[outcome]) for outcome in ("completed", "failed", "rejected")]),
+    ]
+
+metrics_registry.register_collector(component_metrics)
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return profiles.list()
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Collapsed stacks, one `frame;frame;... count` line per stack (flamegraph.pl / speedscope input)"""
+    profile = profiles.get(profile_id)
+    if profile is None:
+        # Profiles live in the worker that recorded them
+        raise HTTPException(status_code=404, detail=f"Profile not found in worker {os.getpid()}")
+    return PlainTextResponse(profile.collapsed())
+
+@app.get("/api/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def list_slow_queries():
+    return {"threshold_ms": SLOW_QUERY_MS, "pid": os.getpid(), "queries": slow_queries.list()}
+
+@app.post("/api/auth/register", dependencies=[Depends(limit_by_client)])
 async def register(user_data: UserCreate):
     # Check if user already exists
     existing_user = await db.users.find_one({"email": user_data.email})
@@ -170,7 +710,7 @@ async def register(user_data: UserCreate):
     
     # Create new user
     user_id = str(uuid.uuid4())
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     
     user_doc = {
         "id": user_id,
@@ -181,6 +721,7 @@ async def register(user_data: UserCreate):
     }
     
     await db.users.insert_one(user_doc)
+    await init_user_stats(db, user_id)
     
     # Create access token
     access_token = create_access_token({"sub": user_id})
@@ -191,13 +732,21 @@ async def register(user_data: UserCreate):
         "token_type": "bearer"
     }
 
-@app.post("/api/auth/login")
+@app.post("/api/auth/login", dependencies=[Depends(limit_by_client)])
 async def login(user_data: UserLogin):
     # Find user
     user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["password"]):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_password(user_data.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Transparently upgrade legacy SHA-256 hashes and outdated work factors
+    if new_hash:
+        # The cached User has no password field, so the user cache stays valid
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password": new_hash}})
+    
     # Create access token
     access_token = create_access_token({"sub": user["id"]})
     
@@ -207,43 +756,456 @@ async def login(user_data: UserLogin):
         "token_type": "bearer"
     }
 
-@app.get("/api/receipts", response_model=List[Receipt])
-async def get_receipts(current_user: User = Depends(get_current_user)):
-    receipts = await db.receipts.find({"user_id": current_user.id}).to_list(None)
-    return [Receipt(**receipt) for receipt in receipts]
+def conditional_response(request: Request, response: Response, user_id: str, state: dict,
+                         *extra: str) -> Optional[Response]:
+    """Set ETag/Last-Modified from the user's data version; returns a 304 when the client copy is current.
+
+    The ETag covers the user, their data version, the path and query string, plus
+    anything else the body depends on (`extra`, e.g. the current month).
+    """
+    key = f"{user_id}:{state['version']}:{request.url.path}?{sorted(request.query_params.multi_items())}:{extra}"
+    headers = {
+        "ETag": f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"',
+        "Last-Modified": format_datetime(state["updated_at"].replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization"
+    }
+    response.headers.update(headers)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return None
+
+async def receipt_page(user_id: str, limit: int, cursor: Optional[str] = None,
+                       purchased: Optional[dict] = None) -> tuple:
+    """One page of receipt documents and the cursor for the next page (None on the last one)"""
+    query = {"user_id": user_id}
+    if purchased:
+        query["purchased_at"] = purchased
+    if cursor:
+        query.update(cursor_filter(cursor))
+    
+    # Fetch one extra document to know whether another page exists
+    receipts = await db.receipts.find(query, RECEIPT_PROJECTION).sort(RECEIPT_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(receipts[limit - 1]) if len(receipts) > limit else None
+    return receipts[:limit], next_cursor
+
+@app.get("/api/receipts", response_model=ReceiptPage)
+async def get_receipts(
+    request: Request,
+    response: Response,
+    limit: int = Query(RECEIPTS_PAGE_SIZE, ge=1, le=RECEIPTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    purchased = purchase_range(date_from, date_to)
+    not_modified = conditional_response(request, response, current_user.id, await get_user_version(db, current_user.id))
+    if not_modified:
+        return not_modified
+    
+    receipts, next_cursor = await receipt_page(current_user.id, limit, cursor, purchased)
+    if FAST_JSON:
+        return ORJSONResponse(
+            {"items": [receipt_json(receipt) for receipt in receipts], "next_cursor": next_cursor},
+            headers=dict(response.headers)
+        )
+    return ReceiptPage(items=[Receipt(**receipt) for receipt in receipts], next_cursor=next_cursor)
 
 @app.post("/api/receipts", response_model=Receipt)
 async def create_receipt(receipt_data: ReceiptCreate, current_user: User = Depends(get_current_user)):
-    receipt_id = str(uuid.uuid4())
-    
-    receipt_doc = {
-        "id": receipt_id,
-        "user_id": current_user.id,
-        **receipt_data.dict(),
-        "created_at": datetime.utcnow()
-    }
+    receipt_doc = new_receipt_doc(current_user.id, receipt_data)
     
     await db.receipts.insert_one(receipt_doc)
+    await receipts_changed(current_user.id, [receipt_doc])
     return Receipt(**receipt_doc)
 
+async def iter_bulk_records(request: Request):
+    """Yield raw records from a JSON array body or, incrementally, from an NDJSON stream.
+
+    A JSON array is checked in full (size and record count) before anything is
+    yielded, so a rejected request writes nothing. An NDJSON line longer than
+    BULK_MAX_LINE_BYTES is skipped and yielded as None.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        if int(request.headers.get("content-length") or 0) > BULK_MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail=f"Body larger than {BULK_MAX_BODY_BYTES} bytes; use NDJSON")
+        # Collected and joined once: growing one bytes object is quadratic and would stall the loop
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > BULK_MAX_BODY_BYTES:
+                raise HTTPException(status_code=413, detail=f"Body larger than {BULK_MAX_BODY_BYTES} bytes; use NDJSON")
+        try:
+            records = orjson.loads(b"".join(chunks))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if len(records) > BULK_MAX_RECORDS:
+            raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_RECORDS} receipts per request")
+        for record in records:
+            yield record
+        return
+    
+    buffer = b""
+    oversized = False
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if oversized or len(line) > BULK_MAX_LINE_BYTES:
+                # An oversized line, or the tail of one already dropped from the buffer
+                oversized = False
+                yield None
+            elif line.strip():
+                yield line
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            oversized = True
+            buffer = b""
+    if oversized:
+        yield None
+    elif buffer.strip():
+        yield buffer
+
+async def insert_receipt_batch(user_id: str, batch: List[tuple], results: List[dict]):
+    """Insert (index, doc) pairs unordered and record the outcome of each one"""
+    docs = [doc for _, doc in batch]
+    failed = {}
+    try:
+        await db.receipts.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details["writeErrors"]}
+    
+    inserted = []
+    for position, (index, doc) in enumerate(batch):
+        if position in failed:
+            results.append({"index": index, "status": "error", "error": failed[position]})
+        else:
+            results.append({"index": index, "status": "ok", "id": doc["id"]})
+            inserted.append(doc)
+    await receipts_changed(user_id, inserted)
+
+@app.post("/api/receipts/bulk", response_model=BulkIngestResult)
+async def bulk_create_receipts(
+    request: Request,
+    batch_size: int = Query(BULK_BATCH_SIZE, ge=1, le=BULK_MAX_BATCH_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    """Ingest many receipts from a JSON array or an NDJSON stream (Content-Type: application/x-ndjson)"""
+    results = []
+    batch = []
+    index = -1
+    truncated = False
+    
+    async for record in iter_bulk_records(request):
+        index += 1
+        if index >= BULK_MAX_RECORDS:
+            # Earlier batches are already written: report them instead of failing the request
+            truncated = True
+            break
+        if record is None:
+            results.append({"index": index, "status": "error", "error": f"Record larger than {BULK_MAX_LINE_BYTES} bytes"})
+            continue
+        try:
+            if isinstance(record, bytes):
+                record = orjson.loads(record)
+            receipt_data = ReceiptCreate(**record)
+        except ValidationError as e:
+            results.append({"index": index, "status": "error", "error": validation_message(e)})
+            continue
+        except (ValueError, TypeError):
+            results.append({"index": index, "status": "error", "error": "Record is not a JSON object"})
+            continue
+        
+        batch.append((index, new_receipt_doc(current_user.id, receipt_data)))
+        if len(batch) >= batch_size:
+            await insert_receipt_batch(current_user.id, batch, results)
+            batch = []
+    
+    if batch:
+        await insert_receipt_batch(current_user.id, batch, results)
+    
+    results.sort(key=lambda result: result["index"])
+    inserted = sum(1 for result in results if result["status"] == "ok")
+    return BulkIngestResult(inserted=inserted, failed=len(results) - inserted, truncated=truncated, results=results)
+
+async def export_ndjson(cursor):
+    async for receipt in cursor:
+        yield orjson.dumps(receipt, option=orjson.OPT_APPEND_NEWLINE)
+
+async def export_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    
+    async for receipt in cursor:
+        # One row per line item; receipts without items still get a row
+        head = [receipt["id"], receipt["retailer"], receipt["date"], receipt["time"], receipt["category"],
+                receipt["subtotal"], receipt["tax"], receipt["total"]]
+        for item in receipt["items"] or [{}]:
+            writer.writerow(head + [item.get("name", ""), item.get("quantity", ""), item.get("price", "")])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@app.get("/api/receipts/export")
+async def export_receipts(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream all of the user's receipts without loading them into memory"""
+    query = {"user_id": current_user.id}
+    purchased = purchase_range(date_from, date_to)
+    if purchased:
+        query["purchased_at"] = purchased
+    
+    cursor = db.receipts.find(query, RECEIPT_PROJECTION).sort(RECEIPT_SORT).batch_size(EXPORT_BATCH_SIZE)
+    
+    if format == "csv":
+        body, media_type = export_csv(cursor), "text/csv"
+    else:
+        body, media_type = export_ndjson(cursor), "application/x-ndjson"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="receipts.{format}"'}
+    )
+
+@app.get("/api/receipts/search", response_model=SearchResults)
+async def search_receipts(
+    q: str = Query(..., min_length=1, max_length=200),
+    prefix: bool = False,
+    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=RECEIPTS_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    """Search retailer, category and item names.
+    
+    Whole words are ranked by text score and paged with `page`. With
+    prefix=true every word is matched as a prefix (typeahead); results come
+    newest first and are paged with `cursor`/`next_cursor` like the listing.
+    """
+    terms = tokenize(q)[:SEARCH_MAX_TERMS]
+    if not terms:
+        raise HTTPException(status_code=400, detail="Query has no searchable words")
+    
+    next_cursor = None
+    if prefix:
+        query = {
+            "user_id": current_user.id,
+            "$and": [{"search_terms": re.compile(f"^{re.escape(term)}")} for term in terms]
+        }
+        if cursor:
+            query.update(cursor_filter(cursor))
+        # A rare (or unmatched) prefix: collect every match through the search_terms index
+        # and order them here. Past SEARCH_PREFIX_CANDIDATES matches that sort would grow
+        # with the user's history, so walk the listing order instead and stop after one
+        # page; a prefix that common fills the page quickly.
+        candidates = await db.receipts.find(
+            query, {"_id": 0, "id": 1, "purchased_at": 1, "created_at": 1}
+        ).hint(SEARCH_TERMS_INDEX).limit(SEARCH_PREFIX_CANDIDATES + 1).to_list(SEARCH_PREFIX_CANDIDATES + 1)
+        if len(candidates) <= SEARCH_PREFIX_CANDIDATES:
+            page_ids = [c["id"] for c in sorted(candidates, key=receipt_sort_key, reverse=True)[:limit + 1]]
+            receipts = await db.receipts.find(
+                {"user_id": current_user.id, "id": {"$in": page_ids}}, RECEIPT_PROJECTION
+            ).to_list(len(page_ids))
+            receipts.sort(key=receipt_sort_key, reverse=True)
+        else:
+            receipts = await db.receipts.find(query, RECEIPT_PROJECTION).sort(RECEIPT_SORT).hint(
+                RECEIPT_SORT_INDEX
+            ).limit(limit + 1).to_list(limit + 1)
+        if len(receipts) > limit:
+            next_cursor = encode_cursor(receipts[limit - 1])
+    else:
+        query = {"user_id": current_user.id, "$text": {"$search": " ".join(terms)}}
+        receipts = await db.receipts.find(query, {**RECEIPT_PROJECTION, "score": {"$meta": "textScore"}}).sort(
+            [("score", {"$meta": "textScore"}), *RECEIPT_SORT]
+        ).skip((page - 1) * limit).limit(limit + 1).to_list(limit + 1)
+    
+    if FAST_JSON:
+        return ORJSONResponse({
+            "items": [receipt_json(receipt) for receipt in receipts[:limit]],
+            "page": page, "has_more": len(receipts) > limit, "next_cursor": next_cursor
+        })
+    return SearchResults(
+        items=[Receipt(**receipt) for receipt in receipts[:limit]],
+        page=page,
+        has_more=len(receipts) > limit,
+        next_cursor=next_cursor
+    )
+
 @app.get("/api/receipts/{receipt_id}", response_model=Receipt)
 async def get_receipt(receipt_id: str, current_user: User = Depends(get_current_user)):
-    receipt = await db.receipts.find_one({"id": receipt_id, "user_id": current_user.id})
+    receipt = await db.receipts.find_one({"id": receipt_id, "user_id": current_user.id}, RECEIPT_PROJECTION)
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
+    if FAST_JSON:
+        return ORJSONResponse(receipt_json(receipt))
     return Receipt(**receipt)
 
 @app.delete("/api/receipts/{receipt_id}")
 async def delete_receipt(receipt_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.receipts.delete_one({"id": receipt_id, "user_id": current_user.id})
-    if result.deleted_count == 0:
+    receipt = await db.receipts.find_one_and_delete({"id": receipt_id, "user_id": current_user.id})
+    if receipt is None:
         raise HTTPException(status_code=404, detail="Receipt not found")
+    await receipts_changed(current_user.id, [receipt], sign=-1)
+    if receipt.get("image"):
+        await delete_files(image_bucket(), receipt["image"]["file_id"], receipt["image"].get("thumbnail_id"))
     return {"message": "Receipt deleted successfully"}
 
-@app.get("/api/analytics/environmental-impact", response_model=EnvironmentalImpact)
-async def get_environmental_impact(current_user: User = Depends(get_current_user)):
-    # Calculate environmental impact based on number of receipts
-    receipt_count = await db.receipts.count_documents({"user_id": current_user.id})
+def image_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=IMAGE_BUCKET)
+
+async def get_receipt_image(receipt_id: str, user_id: str) -> dict:
+    receipt = await db.receipts.find_one({"id": receipt_id, "user_id": user_id}, {"_id": 0, "image": 1})
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    if not receipt.get("image"):
+        raise HTTPException(status_code=404, detail="Receipt has no image")
+    return receipt["image"]
+
+def image_response(request: Request, file_id: str, etag: str, content_type: str, length: int):
+    """Stream a stored file with ETag revalidation and single byte-range support"""
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400"
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        byte_range = parse_range(request.headers.get("range"), length)
+    except RangeNotSatisfiable:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{length}"})
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(stream_file(image_bucket(), file_id), media_type=content_type, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        stream_file(image_bucket(), file_id, start, end),
+        status_code=206,
+        media_type=content_type,
+        headers=headers
+    )
+
+@app.put("/api/receipts/{receipt_id}/image", response_model=ReceiptImage)
+async def upload_receipt_image(receipt_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    """Attach a scan to a receipt. The raw request body is the image; it is streamed into GridFS"""
+    receipt = await db.receipts.find_one({"id": receipt_id, "user_id": current_user.id}, {"_id": 0, "image": 1})
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Upload must be an image")
+    
+    try:
+        image = await store_stream(
+            image_bucket(),
+            request.stream(),
+            filename=f"{receipt_id}",
+            content_type=content_type,
+            metadata={"user_id": current_user.id, "receipt_id": receipt_id}
+        )
+    except ImageTooLarge:
+        raise HTTPException(status_code=413, detail="Image too large")
+    if not image["length"]:
+        await delete_files(image_bucket(), image["file_id"])
+        raise HTTPException(status_code=400, detail="Empty upload")
+    
+    # Only replace the scan this request started from; the returned document is the one
+    # replaced, including a thumbnail generated since it was read
+    unchanged = {"image.file_id": receipt["image"]["file_id"]} if receipt.get("image") else {"image": None}
+    replaced = await db.receipts.find_one_and_update(
+        {"id": receipt_id, "user_id": current_user.id, **unchanged},
+        {"$set": {"image": image}},
+        projection={"_id": 0, "id": 1, "image": 1}
+    )
+    if replaced is None:
+        # A concurrent upload or delete won the race
+        await delete_files(image_bucket(), image["file_id"])
+        raise HTTPException(status_code=409, detail="Image changed, please retry")
+    await bump_version(db, current_user.id)
+    
+    # Remove the previous scan and its thumbnail
+    if replaced.get("image"):
+        await delete_files(image_bucket(), replaced["image"]["file_id"], replaced["image"].get("thumbnail_id"))
+    
+    return ReceiptImage(**image)
+
+@app.get("/api/receipts/{receipt_id}/image")
+async def download_receipt_image(receipt_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    image = await get_receipt_image(receipt_id, current_user.id)
+    return image_response(request, image["file_id"], f'"{image["sha256"]}"', image["content_type"], image["length"])
+
+@app.get("/api/receipts/{receipt_id}/image/thumbnail")
+async def download_receipt_thumbnail(receipt_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    image = await get_receipt_image(receipt_id, current_user.id)
+    
+    if not image.get("thumbnail_id"):
+        # Generated once, off the event loop, then served from GridFS like the original
+        original = await read_file(image_bucket(), image["file_id"])
+        try:
+            thumbnail = await asyncio.get_running_loop().run_in_executor(None, make_thumbnail, original)
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Could not create thumbnail: {e}")
+        
+        async def single_chunk():
+            yield thumbnail
+        
+        stored = await store_stream(
+            image_bucket(), single_chunk(), filename=f"{receipt_id}-thumbnail", content_type="image/jpeg",
+            metadata={"user_id": current_user.id, "receipt_id": receipt_id, "thumbnail_of": image["file_id"]}
+        )
+        result = await db.receipts.update_one(
+            {"id": receipt_id, "user_id": current_user.id, "image.file_id": image["file_id"], "image.thumbnail_id": None},
+            {"$set": {"image.thumbnail_id": stored["file_id"], "image.thumbnail_length": stored["length"]}}
+        )
+        if result.modified_count == 0:
+            # Another request won the race or the image was replaced meanwhile
+            await delete_files(image_bucket(), stored["file_id"])
+            image = await get_receipt_image(receipt_id, current_user.id)
+            if not image.get("thumbnail_id"):
+                raise HTTPException(status_code=409, detail="Image changed, please retry")
+        else:
+            image.update(thumbnail_id=stored["file_id"], thumbnail_length=stored["length"])
+    
+    return image_response(
+        request, image["thumbnail_id"], f'"{image["sha256"]}-thumb"', "image/jpeg", image["thumbnail_length"]
+    )
+
+@app.delete("/api/receipts/{receipt_id}/image")
+async def delete_receipt_image(receipt_id: str, current_user: User = Depends(get_current_user)):
+    receipt = await db.receipts.find_one_and_update(
+        {"id": receipt_id, "user_id": current_user.id, "image": {"$ne": None}},
+        {"$unset": {"image": ""}},
+        projection={"_id": 0, "image": 1}
+    )
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt image not found")
+    await bump_version(db, current_user.id)
+    await delete_files(image_bucket(), receipt["image"]["file_id"], receipt["image"].get("thumbnail_id"))
+    return {"message": "Receipt image deleted successfully"}
+
+def environmental_impact(stats: dict) -> EnvironmentalImpact:
+    receipt_count = stats["receipt_count"]
     
     # Mock calculations - in real implementation, these would be more sophisticated
     trees_saved = receipt_count * 0.037  # ~0.037 trees per receipt
@@ -256,114 +1218,394 @@ async def get_environmental_impact(current_user: User = Depends(get_current_user
         co2_reduced=round(co2_reduced, 1)
     )
 
-@app.get("/api/analytics/spending", response_model=SpendingAnalytics)
-async def get_spending_analytics(current_user: User = Depends(get_current_user)):
-    receipts = await db.receipts.find({"user_id": current_user.id}).to_list(None)
-    
-    if not receipts:
+def spending_analytics(stats: dict, periods: List[str]) -> SpendingAnalytics:
+    if not stats["receipt_count"]:
         return SpendingAnalytics(
             total_spent=0.0,
             category_breakdown={},
             monthly_spending=[]
         )
     
-    # Calculate total spending
-    total_spent = sum(receipt["total"] for receipt in receipts)
-    
-    # Category breakdown
-    category_breakdown = {}
-    for receipt in receipts:
-        category = receipt["category"]
-        category_breakdown[category] = category_breakdown.get(category, 0) + receipt["total"]
-    
-    # Monthly spending (last 6 months)
+    # Zero-fill months without receipts so the chart stays continuous
     monthly_spending = []
-    months = ["Aug", "Sep", "Oct", "Nov", "Dec", "Jan"]
-    for month in months:
-        # Mock data for now - in real implementation, filter by actual dates
-        month_total = total_spent / 6  # Distribute equally for demo
+    for period in periods:
         monthly_spending.append({
-            "month": month,
-            "amount": round(month_total, 2)
+            "month": datetime.strptime(period, "%Y-%m").strftime("%b"),
+            "period": period,
+            "amount": round(stats["months"].get(period, 0.0), 2)
         })
     
     return SpendingAnalytics(
-        total_spent=round(total_spent, 2),
-        category_breakdown={k: round(v, 2) for k, v in category_breakdown.items()},
+        total_spent=round(stats["total_spent"], 2),
+        category_breakdown=category_totals(stats),
         monthly_spending=monthly_spending
     )
 
+async def range_stats(request: Request, response: Response, user_id: str, purchased: dict, *extra: str):
+    """Rollup-shaped totals for a purchased_at range, aggregated from receipts; a 304 Response if unchanged"""
+    not_modified = conditional_response(request, response, user_id, await get_user_version(db, user_id), *extra)
+    if not_modified:
+        return not_modified
+    return await compute_user_stats(db, user_id, purchased)
+
+@app.get("/api/analytics/environmental-impact", response_model=EnvironmentalImpact)
+async def get_environmental_impact(
+    request: Request,
+    response: Response,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    # Calculate environmental impact based on number of receipts
+    purchased = purchase_range(date_from, date_to)
+    if purchased:
+        stats = await range_stats(request, response, current_user.id, purchased)
+        return stats if isinstance(stats, Response) else environmental_impact(stats)
+    
+    stats = await get_user_stats(db, current_user.id)
+    not_modified = conditional_response(request, response, current_user.id, stats)
+    if not_modified:
+        return not_modified
+    return environmental_impact(stats)
+
+@app.get("/api/analytics/spending", response_model=SpendingAnalytics)
+async def get_spending_analytics(
+    request: Request,
+    response: Response,
+    months: int = Query(ANALYTICS_MONTHS, ge=1, le=ANALYTICS_MAX_MONTHS),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    """Totals for the last `months` months from the rollup, or for a `from`/`to` range from the receipts"""
+    purchased = purchase_range(date_from, date_to)
+    if purchased:
+        stats = await range_stats(request, response, current_user.id, purchased)
+        if isinstance(stats, Response):
+            return stats
+        # Months are zero-filled between the first and last month with receipts in the range
+        periods = month_span(min(stats["months"]), max(stats["months"])) if stats["months"] else []
+        return spending_analytics(stats, periods)
+    
+    stats = await get_user_stats(db, current_user.id)
+    # The month window moves with the calendar, so the current month is part of the ETag
+    not_modified = conditional_response(request, response, current_user.id, stats, datetime.utcnow().strftime("%Y-%m"))
+    if not_modified:
+        return not_modified
+    return spending_analytics(stats, month_window(months))
+
+@app.get("/api/dashboard", response_model=Dashboard)
+async def get_dashboard(
+    request: Request,
+    response: Response,
+    limit: int = Query(RECEIPTS_PAGE_SIZE, ge=1, le=RECEIPTS_MAX_PAGE_SIZE),
+    months: int = Query(ANALYTICS_MONTHS, ge=1, le=ANALYTICS_MAX_MONTHS),
+    current_user: User = Depends(get_current_user)
+):
+    """First receipts page, environmental impact and spending in one round trip"""
+    month = datetime.utcnow().strftime("%Y-%m")
+    if request.headers.get("if-none-match"):
+        # Revalidation: the rollup lookup decides, receipts are only read on a miss
+        stats = await get_user_stats(db, current_user.id)
+        not_modified = conditional_response(request, response, current_user.id, stats, month)
+        if not_modified:
+            return not_modified
+        receipts, next_cursor = await receipt_page(current_user.id, limit)
+    else:
+        started = datetime.utcnow()
+        stats, (receipts, next_cursor) = await asyncio.gather(
+            get_user_stats(db, current_user.id),
+            receipt_page(current_user.id, limit)
+        )
+        # A write racing the two reads could pair a new version with an old page; skip the ETag then
+        if stats["updated_at"] < started - timedelta(seconds=1):
+            conditional_response(request, response, current_user.id, stats, month)
+    
+    if FAST_JSON:
+        return ORJSONResponse({
+            "receipts": {"items": [receipt_json(receipt) for receipt in receipts], "next_cursor": next_cursor},
+            "environmental_impact": environmental_impact(stats).dict(),
+            "spending": spending_analytics(stats, month_window(months)).dict()
+        }, headers=dict(response.headers))
+    return Dashboard(
+        receipts=ReceiptPage(items=[Receipt(**receipt) for receipt in receipts], next_cursor=next_cursor),
+        environmental_impact=environmental_impact(stats),
+        spending=spending_analytics(stats, month_window(months))
+    )
+
+async def cached_item_stats(user_id: str, version: int, params: tuple, compute):
+    """Item aggregations cached per user. Entries carry the data version they were computed
+    from, so another worker's write (which cannot invalidate this process) is still noticed."""
+    entry = item_stats_cache.get(user_id)
+    if entry is None or entry["version"] != version:
+        entry = {"version": version, "results": {}}
+        item_stats_cache.set(user_id, entry)
+    if params not in entry["results"]:
+        result = await compute()
+        if len(entry["results"]) >= ITEM_STATS_MAX_QUERIES:
+            entry["results"].pop(next(iter(entry["results"])))
+        entry["results"][params] = result
+    return entry["results"][params]
+
+@app.get("/api/analytics/items/top", response_model=TopItems)
+async def get_top_items(
+    request: Request,
+    response: Response,
+    by: str = Query("spend", pattern="^(spend|count|quantity)$"),
+    limit: int = Query(TOP_ITEMS_LIMIT, ge=1, le=TOP_ITEMS_MAX_LIMIT),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    """Most bought items by spend, number of purchases (count) or units (quantity)"""
+    purchased = purchase_range(date_from, date_to)
+    state = await get_user_version(db, current_user.id)
+    not_modified = conditional_response(request, response, current_user.id, state)
+    if not_modified:
+        return not_modified
+    
+    items = await cached_item_stats(
+        current_user.id, state["version"], ("top", by, limit, date_from, date_to),
+        lambda: top_items(db, current_user.id, by, limit, purchased)
+    )
+    return TopItems(by=by, items=items)
+
+@app.get("/api/analytics/items/prices", response_model=ItemPriceHistory)
+async def get_item_prices(
+    request: Request,
+    response: Response,
+    item: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(ITEM_HISTORY_LIMIT, ge=1, le=ITEM_HISTORY_MAX_LIMIT),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    """Price paid for one item over time and per retailer; `item` is a name or catalog key"""
+    key = item_key(item)
+    if not key:
+        raise HTTPException(status_code=400, detail="Item name has no searchable words")
+    purchased = purchase_range(date_from, date_to)
+    state = await get_user_version(db, current_user.id)
+    not_modified = conditional_response(request, response, current_user.id, state)
+    if not_modified:
+        return not_modified
+    
+    prices = await cached_item_stats(
+        current_user.id, state["version"], ("prices", key, limit, date_from, date_to),
+        lambda: item_prices(db, current_user.id, key, limit, purchased)
+    )
+    if prices is None:
+        raise HTTPException(status_code=404, detail="No purchases of this item")
+    return ItemPriceHistory(**prices)
+
+async def get_chat_context(user_id: str) -> dict:
+    """Spending summary for the LLM, cached per user until their receipts change.
+
+    Entries carry the data version they were built from: receipts_changed only
+    invalidates this process, so writes served by other workers are caught here.
+    """
+    state = await get_user_version(db, user_id)
+    cached = chat_context_cache.get(user_id)
+    if cached is not None and cached["version"] == state["version"]:
+        return cached
+    
+    # Get user's spending rollup and latest receipts for context
+    stats = await get_user_stats(db, user_id)
+    recent = await db.receipts.find(
+        {"user_id": user_id}, {"_id": 0, "retailer": 1}
+    ).sort(RECEIPT_SORT).limit(3).to_list(3)
+    
+    # Keep the prompt bounded: only the biggest categories
+    categories = sorted(category_totals(stats).items(), key=lambda entry: entry[1], reverse=True)
+    categories = categories[:AI_CONTEXT_MAX_CATEGORIES]
+    
+    context = f"""
+    User's spending data:
+    - Total spent: ${stats['total_spent']:.2f}
+    - Number of receipts: {stats['receipt_count']}
+    - Top categories: {', '.join([f'{cat}: ${amount:.2f}' for cat, amount in categories])}
+    - Recent receipts: {[r['retailer'] for r in recent] if recent else 'None'}
+    """[:AI_CONTEXT_MAX_CHARS]
+    
+    entry = {"context": context, "receipt_count": stats["receipt_count"], "version": stats.get("version", 0)}
+    chat_context_cache.set(user_id, entry)
+    return entry
+
+async def fallback_receipt_count(user_id: str) -> int:
+    """Receipt count for the fallback reply without building the chat context"""
+    cached = chat_context_cache.get(user_id)
+    if cached is not None:
+        return cached["receipt_count"]
+    stats = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0, "receipt_count": 1})
+    return stats["receipt_count"] if stats else 0
+
+def chat_session_key(user_id: str, session_id: Optional[str]) -> str:
+    return f"user_{user_id}" + (f"_{session_id}" if session_id else "")
+
+def fallback_reply(message: str, receipt_count: int) -> str:
+    return f"I understand you're asking about '{message}'. Based on your current data, I can see you have {receipt_count} receipts. This helps track your environmental impact by going digital!"
+
+def sse_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: ".encode() + orjson.dumps(data) + b"\n\n"
+
+@app.get("/api/ai/metrics")
+async def ai_metrics():
+    return llm_guard.stats()
+
 @app.post("/api/ai/chat")
 async def ai_chat(query: AIQuery, current_user: User = Depends(get_current_user)):
+    # While the breaker is open the LLM call would be refused; skip the context queries too
+    if llm_guard.circuit_open():
+        return {"response": fallback_reply(query.message, await fallback_receipt_count(current_user.id))}
+    
     try:
-        # Get user's receipts for context
-        receipts = await db.receipts.find({"user_id": current_user.id}).to_list(None)
-        
-        # Prepare context about user's spending
-        total_spent = sum(receipt["total"] for receipt in receipts)
-        categories = {}
-        for receipt in receipts:
-            category = receipt["category"]
-            categories[category] = categories.get(category, 0) + receipt["total"]
-        
-        context = f"""
-        User's spending data:
-        - Total spent: ${total_spent:.2f}
-        - Number of receipts: {len(receipts)}
-        - Categories: {', '.join([f'{cat}: ${amount:.2f}' for cat, amount in categories.items()])}
-        - Recent receipts: {[r['retailer'] for r in receipts[-3:]] if receipts else 'None'}
-        """
+        chat_context = await get_chat_context(current_user.id)
         
-        # Initialize LLM chat with Emergent key
-        emergent_llm_key = os.getenv("EMERGENT_LLM_KEY")
-        if not emergent_llm_key:
-            raise HTTPException(status_code=500, detail="LLM service not configured")
+        try:
+            provider = get_llm_provider(chat_session_cache)
+        except LLMNotConfigured as e:
+            raise HTTPException(status_code=500, detail=str(e))
         
-        chat = LlmChat(
-            api_key=emergent_llm_key,
-            session_id=f"user_{current_user.id}",
-            system_message=f"""You are an AI assistant for EcoReceipt, a digital receipt manager. 
-            You help users understand their spending patterns and environmental impact.
-            
-            Context about this user: {context}
-            
-            Provide helpful insights about their spending, suggest ways to save money or be more eco-friendly.
-            Keep responses concise and friendly. Focus on actionable advice."""
-        ).with_model("openai", "gpt-4o-mini")
-        
-        # Create user message
-        user_message = UserMessage(text=query.message)
-        
-        # Get AI response
-        ai_response = await chat.send_message(user_message)
+        # Get AI response; identical questions already in flight share one upstream call
+        session_key = chat_session_key(current_user.id, query.session_id)
+        ai_response = await llm_guard.complete(
+            (session_key, query.message.strip().lower()),
+            lambda: provider.complete(session_key, chat_context["context"], query.message)
+        )
         
         return {"response": ai_response}
         
     except Exception as e:
         # Fallback to mock response if AI fails
-        return {"response": f"I understand you're asking about '{query.message}'. Based on your current data, I can see you have {len(receipts) if 'receipts' in locals() else 0} receipts. This helps track your environmental impact by going digital!"}
-
-@app.post("/api/receipts/ocr")
-async def process_receipt_ocr(current_user: User = Depends(get_current_user)):
-    # Mock OCR processing since no API keys available
-    # In real implementation, this would process uploaded images
-    mock_receipt = {
-        "retailer": "Digital Store",
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "time": datetime.now().strftime("%H:%M"),
-        "items": [
-            {"name": "Sample Item 1", "quantity": 1, "price": 15.99},
-            {"name": "Sample Item 2", "quantity": 2, "price": 24.98}
-        ],
-        "subtotal": 40.97,
-        "tax": 4.10,
-        "total": 45.07,
-        "category": "General",
-        "logo": "https://placehold.co/50x50/4CAF50/FFFFFF?text=DS"
-    }
+        return {"response": fallback_reply(query.message, chat_context['receipt_count'] if 'chat_context' in locals() else 0)}
+
+@app.post("/api/ai/chat/stream")
+async def ai_chat_stream(query: AIQuery, request: Request, current_user: User = Depends(get_current_user)):
+    """Stream the reply as Server-Sent Events: `token` events, then `done` (or `error` with the fallback text)"""
+    chat_context = None if llm_guard.circuit_open() else await get_chat_context(current_user.id)
+    
+    async def events():
+        if chat_context is None:
+            yield sse_event("error", {"text": fallback_reply(query.message, await fallback_receipt_count(current_user.id))})
+            return
+        pieces = None
+        try:
+            provider = get_llm_provider(chat_session_cache)
+            pieces = llm_guard.stream(provider.stream(
+                chat_session_key(current_user.id, query.session_id), chat_context["context"], query.message
+            ))
+            async for piece in pieces:
+                # Stop generating (and paying for tokens) once the client has gone
+                if await request.is_disconnected():
+                    break
+                yield sse_event("token", {"text": piece})
+            else:
+                yield sse_event("done", {})
+        except Exception:
+            yield sse_event("error", {"text": fallback_reply(query.message, chat_context["receipt_count"])})
+        finally:
+            if pieces is not None:
+                await pieces.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Multipart boundaries and part headers around the image
+OCR_FORM_OVERHEAD = 64 * 1024
+
+async def read_ocr_upload(request: Request) -> tuple:
+    """Parse the multipart body without spooling more than OCR_MAX_UPLOAD_BYTES of it"""
+    limit = OCR_MAX_UPLOAD_BYTES + OCR_FORM_OVERHEAD
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=413, detail="Image too large")
+    content_type = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip().lower() != "multipart/form-data":
+        raise HTTPException(status_code=415, detail="Upload the image as multipart/form-data")
+    if "boundary=" not in content_type.lower():
+        raise HTTPException(status_code=400, detail="Multipart body has no boundary")
+    
+    async def capped():
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise HTTPException(status_code=413, detail="Image too large")
+            yield chunk
+    
+    try:
+        form = await MultiPartParser(request.headers, capped(), max_files=1, max_fields=10).parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    try:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=422, detail="Missing file field")
+        image = await file.read(OCR_MAX_UPLOAD_BYTES + 1)
+        if len(image) > OCR_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large")
+        return image, file.filename
+    finally:
+        await form.close()
+
+@app.post("/api/receipts/ocr", status_code=202, openapi_extra={"requestBody": {"required": True, "content": {
+    "multipart/form-data": {"schema": {"type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}
+}}})
+async def process_receipt_ocr(request: Request, current_user: User = Depends(get_current_user)):
+    """Queue a receipt image for OCR; poll GET /api/receipts/ocr/{job_id} for the parsed receipt"""
+    image, filename = await read_ocr_upload(request)
+    if not image:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    
+    try:
+        job_id = await ocr_queue.submit(current_user.id, image, filename)
+    except OCRQueueFull:
+        raise HTTPException(status_code=503, detail="OCR queue is full, please retry", headers={"Retry-After": "5"})
     
-    return {"parsed_receipt": mock_receipt, "message": "Receipt processed successfully (mock data)"}
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/api/receipts/ocr/{job_id}")
+async def get_ocr_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await db.ocr_jobs.find_one({"id": job_id, "user_id": current_user.id}, {"_id": 0, "user_id": 0, "owner": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
+
+async def prepare_before_workers() -> bool:
+    """Indexes, migrations and the query-plan check, run once instead of racing in every worker"""
+    global client, db
+    client = create_mongo_client()
+    db = client[DB_NAME]
+    try:
+        try:
+            await client.admin.command('ping')
+            await prepare_database()
+            if AUTO_MIGRATE:
+                await run_startup_migrations()
+        except Exception as e:
+            print(f"❌ Database preparation failed, workers will retry: {e}")
+            return False
+        if VERIFY_QUERY_PLANS:
+            await verify_query_plans(db)
+        return True
+    finally:
+        client.close()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # WEB_CONCURRENCY worker processes, each with its own event loop and Mongo pool.
+    # On SIGTERM uvicorn stops accepting connections and waits for open requests
+    # before the lifespan shutdown runs.
+    if WEB_CONCURRENCY > 1 and asyncio.run(prepare_before_workers()):
+        os.environ["DB_PREPARED"] = "1"
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8001")),
+        workers=WEB_CONCURRENCY,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        timeout_graceful_shutdown=int(SHUTDOWN_DRAIN_TIMEOUT)
+    )
@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+# Per-user analytics rollups. One document per user in `user_stats`:
+#   {user_id, receipt_count, total_spent, categories: {name: sum}, months: {"YYYY-MM": sum},
+#    version, updated_at}
+# Receipt writes keep it current with $inc; rebuild_user_stats recomputes it from raw receipts.
+# `version` goes up with every change to the user's receipts and drives ETags.
+
+# Totals below this are treated as zero (float residue after decrements)
+EPSILON = 0.005
+
+
+# Stands in for an empty name, which is not a valid MongoDB field name
+EMPTY_KEY = "(none)"
+
+
+def escape_key(value: str) -> str:
+    """Make a category name or month safe to use as a MongoDB field name"""
+    return value.replace(".", "．").replace("$", "＄") or EMPTY_KEY
+
+
+def unescape_key(value: str) -> str:
+    return value.replace("．", ".").replace("＄", "$")
+
+
+def month_key(date: str) -> str:
+    return escape_key(date[:7])
+
+
+def receipts_delta(receipts: Iterable[dict], sign: int = 1) -> dict:
+    """Build the $inc document for adding (sign=1) or removing (sign=-1) receipts"""
+    inc = {"receipt_count": 0, "total_spent": 0.0}
+    for receipt in receipts:
+        total = sign * receipt["total"]
+        inc["receipt_count"] += sign
+        inc["total_spent"] += total
+        category_field = f"categories.{escape_key(receipt['category'])}"
+        month_field = f"months.{month_key(receipt['date'])}"
+        inc[category_field] = inc.get(category_field, 0.0) + total
+        inc[month_field] = inc.get(month_field, 0.0) + total
+    return inc
+
+
+async def apply_receipts(db, user_id: str, receipts: List[dict], sign: int = 1) -> None:
+    """Fold receipt writes into the user's rollup atomically"""
+    if not receipts:
+        return
+    try:
+        result = await db.user_stats.update_one(
+            {"user_id": user_id},
+            {"$inc": {**receipts_delta(receipts, sign), "version": 1}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+    except PyMongoError as e:
+        # The receipts are already written; recompute rather than leave the rollup behind them
+        print(f"⚠️  Rollup update failed for {user_id}, rebuilding: {e}")
+        await rebuild_user_stats(db, user_id)
+        return
+    if result.matched_count == 0:
+        # No rollup yet (user predates rollups): build it from the receipts, which already include this write
+        await rebuild_user_stats(db, user_id)
+
+
+async def bump_version(db, user_id: str) -> None:
+    """Mark a user's receipts as changed without touching the totals (e.g. an image was attached)"""
+    await db.user_stats.update_one(
+        {"user_id": user_id},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}}
+    )
+
+
+async def get_user_version(db, user_id: str) -> dict:
+    """Just {version, updated_at}: the cheap lookup behind conditional GETs"""
+    stats = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0, "version": 1, "updated_at": 1})
+    if stats is None:
+        stats = await get_user_stats(db, user_id)
+    return {"version": stats.get("version", 0), "updated_at": stats["updated_at"]}
+
+
+async def init_user_stats(db, user_id: str) -> None:
+    await db.user_stats.update_one(
+        {"user_id": user_id},
+        {"$setOnInsert": {
+            "user_id": user_id,
+            "receipt_count": 0,
+            "total_spent": 0.0,
+            "categories": {},
+            "months": {},
+            "version": 0,
+            "updated_at": datetime.utcnow(),
+        }},
+        upsert=True
+    )
+
+
+async def compute_user_stats(db, user_id: str, purchased: Optional[dict] = None) -> dict:
+    """Recompute a user's rollup from raw receipts with a single aggregation.
+
+    `purchased` restricts it to a purchased_at range (served by the user_id_purchased_at index).
+    """
+    match = {"user_id": user_id}
+    if purchased:
+        match["purchased_at"] = purchased
+    pipeline = [
+        {"$match": match},
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "count": {"$sum": 1}, "total": {"$sum": "$total"}}}
+            ],
+            "categories": [
+                {"$group": {"_id": "$category", "total": {"$sum": "$total"}}}
+            ],
+            "months": [
+                {"$group": {"_id": {"$substrCP": ["$date", 0, 7]}, "total": {"$sum": "$total"}}}
+            ],
+        }},
+    ]
+    result = (await db.receipts.aggregate(pipeline).to_list(1))[0]
+    totals = result["totals"][0] if result["totals"] else {"count": 0, "total": 0.0}
+    return {
+        "user_id": user_id,
+        "receipt_count": totals["count"],
+        "total_spent": totals["total"],
+        "categories": {escape_key(row["_id"] or ""): row["total"] for row in result["categories"]},
+        "months": {escape_key(row["_id"] or ""): row["total"] for row in result["months"]},
+    }
+
+
+async def rebuild_user_stats(db, user_id: str, write: bool = True) -> dict:
+    """Recompute a user's rollup and return the drift against the stored one"""
+    stored = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
+    fresh = await compute_user_stats(db, user_id)
+    if write:
+        # The version keeps counting across rebuilds, so old ETags never match again
+        await db.user_stats.update_one(
+            {"user_id": user_id},
+            {"$set": {**fresh, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+            upsert=True
+        )
+    return stats_drift(stored, fresh)
+
+
+def _close(a, b) -> bool:
+    # Rollups written before keys were escaped can hold nested documents; those always count as drift
+    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+        return False
+    return abs(a - b) < EPSILON
+
+
+def stats_drift(stored: Optional[dict], fresh: dict) -> dict:
+    """Differences between a stored rollup and a freshly computed one; empty if they agree"""
+    if stored is None:
+        return {"missing": True} if fresh["receipt_count"] else {}
+
+    drift = {}
+    if stored.get("receipt_count", 0) != fresh["receipt_count"]:
+        drift["receipt_count"] = (stored.get("receipt_count", 0), fresh["receipt_count"])
+    if not _close(stored.get("total_spent", 0.0), fresh["total_spent"]):
+        drift["total_spent"] = (stored.get("total_spent", 0.0), fresh["total_spent"])
+    for field in ("categories", "months"):
+        old, new = stored.get(field, {}), fresh[field]
+        for key in set(old) | set(new):
+            if not _close(old.get(key, 0.0), new.get(key, 0.0)):
+                drift[f"{field}.{unescape_key(key)}"] = (old.get(key, 0.0), new.get(key, 0.0))
+    return drift
+
+
+async def get_user_stats(db, user_id: str) -> dict:
+    """Fetch a user's rollup, building it on first use"""
+    stats = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
+    if stats is None:
+        await rebuild_user_stats(db, user_id)
+        stats = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
+    return stats
+
+
+# Item analytics: aggregated from receipt line items on demand (server.py caches them per data version)
+
+ITEM_SORT_FIELDS = {"spend": "spend", "count": "purchases", "quantity": "quantity"}
+
+
+def _receipt_match(user_id: str, purchased: Optional[dict]) -> dict:
+    match = {"user_id": user_id}
+    if purchased:
+        match["purchased_at"] = purchased
+    return match
+
+
+async def top_items(db, user_id: str, by: str = "spend", limit: int = 10, purchased: Optional[dict] = None) -> list:
+    """Items ranked by spend, number of purchases or units bought"""
+    pipeline = [
+        {"$match": _receipt_match(user_id, purchased)},
+        {"$project": {"_id": 0, "retailer": 1, "items": 1}},
+        {"$unwind": "$items"},
+        # Lines without a usable key (written before keys existed, or keyed ASCII-only
+        # to "") fall back to the lowercased name until migrated
+        {"$group": {
+            "_id": {"$cond": [
+                {"$gt": [{"$ifNull": ["$items.key", ""]}, ""]}, "$items.key", {"$toLower": "$items.name"}
+            ]},
+            "name": {"$first": "$items.name"},
+            "spend": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}},
+            "quantity": {"$sum": "$items.quantity"},
+            "purchases": {"$sum": 1},
+            "retailers": {"$addToSet": "$retailer"},
+        }},
+        {"$sort": {ITEM_SORT_FIELDS[by]: -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+    items = []
+    async for row in db.receipts.aggregate(pipeline):
+        row["key"] = row.pop("_id")
+        row["spend"] = round(row["spend"], 2)
+        row["retailers"] = sorted(row["retailers"])
+        items.append(row)
+    return items
+
+
+async def item_prices(db, user_id: str, key: str, limit: int = 100, purchased: Optional[dict] = None) -> Optional[dict]:
+    """Latest `limit` purchases of one item and its price range per retailer; None if never bought"""
+    match = _receipt_match(user_id, purchased)
+    match["items.key"] = key
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"purchased_at": 1, "created_at": 1}},
+        {"$unwind": "$items"},
+        {"$match": {"items.key": key}},
+        {"$facet": {
+            "history": [
+                {"$sort": {"purchased_at": -1, "created_at": -1}},
+                {"$limit": limit},
+                {"$project": {
+                    "_id": 0, "purchased_at": 1, "date": 1, "retailer": 1,
+                    "name": "$items.name", "price": "$items.price", "quantity": "$items.quantity",
+                }},
+            ],
+            "retailers": [
+                {"$group": {
+                    "_id": "$retailer",
+                    "purchases": {"$sum": 1},
+                    "min_price": {"$min": "$items.price"},
+                    "max_price": {"$max": "$items.price"},
+                    "avg_price": {"$avg": "$items.price"},
+                    "last_price": {"$last": "$items.price"},
+                }},
+                {"$sort": {"avg_price": 1, "_id": 1}},
+            ],
+        }},
+    ]
+    result = (await db.receipts.aggregate(pipeline).to_list(1))[0]
+    if not result["history"]:
+        return None
+    for row in result["retailers"]:
+        row["retailer"] = row.pop("_id")
+        row["avg_price"] = round(row["avg_price"], 2)
+    history = result["history"][::-1]
+    return {"key": key, "name": history[-1]["name"], "history": history, "retailers": result["retailers"]}
+
+
+def category_totals(stats: dict) -> dict:
+    return {
+        unescape_key(key): round(value, 2)
+        for key, value in stats.get("categories", {}).items()
+        if abs(value) >= EPSILON
+    }
+
+
+async def repair_all(db, user_id: Optional[str] = None, write: bool = True) -> dict:
+    """Rebuild rollups for one or all users and report the ones that had drifted"""
+    if user_id:
+        user_ids = [user_id]
+    else:
+        user_ids = set(await db.receipts.distinct("user_id")) | set(await db.user_stats.distinct("user_id"))
+
+    report = {}
+    for uid in sorted(user_ids):
+        drift = await rebuild_user_stats(db, uid, write=write)
+        if drift:
+            report[uid] = drift
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild user_stats rollups from raw receipts")
+    parser.add_argument("--user", help="only rebuild this user id")
+    parser.add_argument("--check", action="store_true", help="report drift without writing")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "ecoreceipt")]
+
+    report = await repair_all(db, user_id=args.user, write=not args.check)
+    for uid, drift in report.items():
+        print(f"⚠️  {uid}: {drift}")
+    action = "found" if args.check else "repaired"
+    print(f"\nDrift {action} for {len(report)} user(s)")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
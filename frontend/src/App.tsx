@@ -49,21 +49,23 @@ const apiService = {
     return response;
   },
 
-  async getReceipts() {
-    const response = await this.fetchWithAuth('/api/receipts');
-    if (!response) return [];
+  async getReceipts(cursor?: string) {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await this.fetchWithAuth(`/api/receipts${query}`);
+    if (!response) return { items: [], next_cursor: null };
     return response.json();
   },
 
-  async getEnvironmentalImpact() {
-    const response = await this.fetchWithAuth('/api/analytics/environmental-impact');
-    if (!response) return null;
+  async searchReceipts(query: string) {
+    const response = await this.fetchWithAuth(`/api/receipts/search?prefix=true&q=${encodeURIComponent(query)}`);
+    if (!response || !response.ok) return { items: [], page: 1, has_more: false };
     return response.json();
   },
 
-  async getSpendingAnalytics() {
-    const response = await this.fetchWithAuth('/api/analytics/spending');
-    if (!response) return null;
+  // First receipts page, environmental impact and spending in one request
+  async getDashboard() {
+    const response = await this.fetchWithAuth('/api/dashboard');
+    if (!response || !response.ok) return null;
     return response.json();
   },
 
@@ -76,6 +78,39 @@ const apiService = {
     return response.json();
   },
 
+  async streamChatMessage(message: string, onText: (text: string) => void, onError: (text: string) => void) {
+    const response = await this.fetchWithAuth('/api/ai/chat/stream', {
+      method: 'POST',
+      body: JSON.stringify({ message }),
+    });
+    if (!response || !response.ok || !response.body) {
+      throw new Error('Unable to connect to AI service');
+    }
+
+    // Parse Server-Sent Events as they arrive
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop() || '';
+      for (const event of events) {
+        const lines = event.split('\n');
+        const dataLine = lines.find(line => line.startsWith('data: '));
+        if (!dataLine) continue;
+        const data = JSON.parse(dataLine.slice(6));
+        if (lines.includes('event: error')) {
+          onError(data.text);
+        } else if (data.text) {
+          onText(data.text);
+        }
+      }
+    }
+  },
+
   async login(email: string, password: string) {
     const response = await fetch(`${API_BASE_URL}/api/auth/login`, {
       method: 'POST',
@@ -110,6 +145,8 @@ function App() {
   const [chatMessages, setChatMessages] = useState([]);
   const [currentMessage, setCurrentMessage] = useState('');
   const [receipts, setReceipts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [searchResults, setSearchResults] = useState(null);
   const [environmentalImpact, setEnvironmentalImpact] = useState(null);
   const [spendingAnalytics, setSpendingAnalytics] = useState(null);
   const [user, setUser] = useState(null);
@@ -143,15 +180,12 @@ function App() {
     if (!user) return;
     
     try {
-      const [receiptsData, impactData, analyticsData] = await Promise.all([
-        apiService.getReceipts(),
-        apiService.getEnvironmentalImpact(),
-        apiService.getSpendingAnalytics()
-      ]);
+      const dashboard = await apiService.getDashboard();
       
-      setReceipts(receiptsData || []);
-      setEnvironmentalImpact(impactData);
-      setSpendingAnalytics(analyticsData);
+      setReceipts(dashboard?.receipts.items || []);
+      setNextCursor(dashboard?.receipts.next_cursor || null);
+      setEnvironmentalImpact(dashboard?.environmental_impact || null);
+      setSpendingAnalytics(dashboard?.spending || null);
     } catch (error) {
       console.error('Error loading data:', error);
     }
@@ -171,15 +205,12 @@ function App() {
         
         // Load data immediately after login with user data
         try {
-          const [receiptsData, impactData, analyticsData] = await Promise.all([
-            apiService.getReceipts(),
-            apiService.getEnvironmentalImpact(),
-            apiService.getSpendingAnalytics()
-          ]);
+          const dashboard = await apiService.getDashboard();
           
-          setReceipts(receiptsData || []);
-          setEnvironmentalImpact(impactData);
-          setSpendingAnalytics(analyticsData);
+          setReceipts(dashboard?.receipts.items || []);
+          setNextCursor(dashboard?.receipts.next_cursor || null);
+          setEnvironmentalImpact(dashboard?.environmental_impact || null);
+          setSpendingAnalytics(dashboard?.spending || null);
         } catch (error) {
           console.error('Error loading data after login:', error);
         }
@@ -207,15 +238,12 @@ function App() {
         
         // Load data immediately after registration
         try {
-          const [receiptsData, impactData, analyticsData] = await Promise.all([
-            apiService.getReceipts(),
-            apiService.getEnvironmentalImpact(),
-            apiService.getSpendingAnalytics()
-          ]);
+          const dashboard = await apiService.getDashboard();
           
-          setReceipts(receiptsData || []);
-          setEnvironmentalImpact(impactData);
-          setSpendingAnalytics(analyticsData);
+          setReceipts(dashboard?.receipts.items || []);
+          setNextCursor(dashboard?.receipts.next_cursor || null);
+          setEnvironmentalImpact(dashboard?.environmental_impact || null);
+          setSpendingAnalytics(dashboard?.spending || null);
         } catch (error) {
           console.error('Error loading data after registration:', error);
         }
@@ -235,6 +263,7 @@ function App() {
     setUser(null);
     setCurrentScreen('login');
     setReceipts([]);
+    setNextCursor(null);
     setEnvironmentalImpact(null);
     setSpendingAnalytics(null);
     setChatMessages([]);
@@ -249,12 +278,31 @@ function App() {
     setLoading(true);
     
     try {
-      const result = await apiService.sendChatMessage(currentMessage);
-      const aiResponse = { 
-        type: 'ai', 
-        message: result.response || "I'm having trouble connecting right now. Please try again!"
-      };
-      setChatMessages(prev => [...prev, aiResponse]);
+      // Show the reply as it streams in, growing the last AI message
+      let started = false;
+      await apiService.streamChatMessage(currentMessage, (text) => {
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setChatMessages(prev => [...prev, { type: 'ai', message: text }]);
+          return;
+        }
+        setChatMessages(prev => [
+          ...prev.slice(0, -1),
+          { ...prev[prev.length - 1], message: prev[prev.length - 1].message + text }
+        ]);
+      }, (text) => {
+        // The fallback stands in for the whole reply, not a continuation of it
+        const replace = started;
+        started = true;
+        setLoading(false);
+        setChatMessages(prev => replace
+          ? [...prev.slice(0, -1), { type: 'ai', message: text }]
+          : [...prev, { type: 'ai', message: text }]);
+      });
+      if (!started) {
+        setChatMessages(prev => [...prev, { type: 'ai', message: "I'm having trouble connecting right now. Please try again!" }]);
+      }
     } catch (error) {
       const errorResponse = { 
         type: 'ai', 
@@ -266,14 +314,48 @@ function App() {
     }
   };
 
+  const loadMoreReceipts = async () => {
+    if (!nextCursor) return;
+    
+    try {
+      const page = await apiService.getReceipts(nextCursor);
+      setReceipts(prev => [...prev, ...(page?.items || [])]);
+      setNextCursor(page?.next_cursor || null);
+    } catch (error) {
+      console.error('Error loading receipts:', error);
+    }
+  };
+
   const handleSuggestedQuestion = (question) => {
     setCurrentMessage(question);
     setTimeout(() => handleSendMessage(), 100);
   };
 
-  const filteredReceipts = receipts.filter(receipt =>
-    receipt.retailer.toLowerCase().includes(searchQuery.toLowerCase())
-  );
+  // Search runs on the server, debounced while the user types
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
+    }
+    
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const results = await apiService.searchReceipts(query);
+        if (!cancelled) setSearchResults(results?.items || []);
+      } catch (error) {
+        console.error('Error searching receipts:', error);
+      }
+    }, 250);
+    
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  const filteredReceipts = searchQuery.trim() ? (searchResults || []) : receipts;
 
   const sortedReceipts = [...filteredReceipts].sort((a, b) => {
     switch (sortBy) {
@@ -544,6 +626,14 @@ function App() {
             </div>
           ))}
         </div>
+        {nextCursor && !searchQuery.trim() && (
+          <button
+            onClick={loadMoreReceipts}
+            className="w-full mt-4 py-2 text-green-600 font-medium hover:bg-green-50 rounded-xl transition-colors"
+          >
+            Load more
+          </button>
+        )}
       </div>
     </div>
   );
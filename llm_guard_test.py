@@ -0,0 +1,202 @@
+import asyncio
+import os
+import sys
+
+# Offline tests for the LLM guard in backend/llm.py; no server or database needed
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from llm import CircuitBreaker, LLMGuard, LLMUnavailable
+
+
+class Boom(Exception):
+    pass
+
+
+async def ok():
+    return "ok"
+
+
+async def fail():
+    raise Boom()
+
+
+def guard(failures=2, reset=0.05, timeout=1.0, concurrency=4):
+    return LLMGuard(max_concurrency=concurrency, queue_timeout=0.05, timeout=timeout,
+                    breaker=CircuitBreaker(failure_threshold=failures, reset_timeout=reset))
+
+
+async def expect(exception, awaitable):
+    try:
+        await awaitable
+    except exception:
+        return
+    raise AssertionError(f"expected {exception.__name__}")
+
+
+class LLMGuardTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+
+    def run_test(self, name, test):
+        self.tests_run += 1
+        print(f"\n🔍 Testing {name}...")
+        try:
+            asyncio.run(test())
+        except Exception as e:
+            print(f"❌ Failed - {type(e).__name__}: {e}")
+            return False
+        self.tests_passed += 1
+        print("✅ Passed")
+        return True
+
+    async def breaker_trips(self):
+        g = guard(failures=2)
+        await expect(Boom, g.complete("a", fail))
+        assert g.breaker.state == CircuitBreaker.CLOSED
+        await expect(Boom, g.complete("b", fail))
+        assert g.breaker.state == CircuitBreaker.OPEN and g.breaker.trips == 1
+        assert g.circuit_open()
+
+        calls = []
+        async def counted():
+            calls.append(1)
+            return "ok"
+        await expect(LLMUnavailable, g.complete("c", counted))
+        assert not calls, "an open breaker must not reach the provider"
+        assert g.breaker.rejected == 2
+
+    async def success_resets_failures(self):
+        g = guard(failures=2)
+        await expect(Boom, g.complete("a", fail))
+        assert await g.complete("b", ok) == "ok"
+        await expect(Boom, g.complete("c", fail))
+        assert g.breaker.state == CircuitBreaker.CLOSED
+
+    async def half_open_single_trial(self):
+        g = guard(failures=1, reset=0.05)
+        await expect(Boom, g.complete("a", fail))
+        await asyncio.sleep(0.06)
+        assert not g.circuit_open()
+
+        started, release = asyncio.Event(), asyncio.Event()
+        async def slow():
+            started.set()
+            await release.wait()
+            return "ok"
+        trial = asyncio.ensure_future(g.complete("trial", slow))
+        await started.wait()
+        assert g.breaker.state == CircuitBreaker.HALF_OPEN
+        await expect(LLMUnavailable, g.complete("other", ok))
+        release.set()
+        assert await trial == "ok"
+        assert g.breaker.state == CircuitBreaker.CLOSED
+
+    async def half_open_failure_reopens(self):
+        g = guard(failures=3, reset=0.05)
+        for key in "abc":
+            await expect(Boom, g.complete(key, fail))
+        await asyncio.sleep(0.06)
+        await expect(Boom, g.complete("trial", fail))
+        assert g.breaker.state == CircuitBreaker.OPEN and g.breaker.trips == 2
+        assert g.circuit_open()
+
+    async def timeout_counts_as_failure(self):
+        g = guard(failures=1, timeout=0.02)
+        async def hang():
+            await asyncio.sleep(1)
+        await expect(asyncio.TimeoutError, g.complete("a", hang))
+        assert g.timeouts == 1 and g.breaker.state == CircuitBreaker.OPEN
+        assert g.active == 0
+
+    async def stream_timeout(self):
+        g = guard(failures=1, timeout=0.03)
+        async def pieces():
+            yield "a"
+            await asyncio.sleep(1)
+            yield "b"
+        seen = []
+        async def consume():
+            async for piece in g.stream(pieces()):
+                seen.append(piece)
+        await expect(asyncio.TimeoutError, consume())
+        assert seen == ["a"] and g.timeouts == 1 and g.breaker.state == CircuitBreaker.OPEN
+
+    async def coalescing(self):
+        g = guard()
+        calls = []
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "shared"
+        results = await asyncio.gather(*[g.complete("same", slow) for _ in range(5)])
+        assert results == ["shared"] * 5 and len(calls) == 1 and g.coalesced == 4
+        assert not g._inflight
+        assert await g.complete("same", slow) == "shared" and len(calls) == 2
+
+    async def coalesced_failure(self):
+        g = guard(failures=5)
+        async def slow_fail():
+            await asyncio.sleep(0.02)
+            raise Boom()
+        results = await asyncio.gather(*[g.complete("same", slow_fail) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(r, Boom) for r in results)
+        assert g.breaker.failures == 1, "one upstream call, one failure"
+
+    async def waiter_cancel_keeps_shared_call(self):
+        g = guard()
+        async def slow():
+            await asyncio.sleep(0.03)
+            return "ok"
+        first = asyncio.ensure_future(g.complete("same", slow))
+        second = asyncio.ensure_future(g.complete("same", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "ok" and g.coalesced == 1
+
+    async def concurrency_cap(self):
+        g = guard(concurrency=1)
+        started, release = asyncio.Event(), asyncio.Event()
+        async def held():
+            started.set()
+            await release.wait()
+            return "ok"
+        busy = asyncio.ensure_future(g.complete("a", held))
+        await started.wait()
+        await expect(LLMUnavailable, g.complete("b", ok))
+        assert g.overloaded == 1 and g.breaker.state == CircuitBreaker.CLOSED
+        release.set()
+        await busy
+
+    def run_all_tests(self):
+        tests = [
+            ("Breaker trips after consecutive failures", self.breaker_trips),
+            ("Success resets the failure count", self.success_resets_failures),
+            ("Half-open lets one trial through", self.half_open_single_trial),
+            ("Failed trial re-opens the breaker", self.half_open_failure_reopens),
+            ("Timeout counts as a failure", self.timeout_counts_as_failure),
+            ("Stream deadline", self.stream_timeout),
+            ("Identical calls coalesce", self.coalescing),
+            ("Coalesced failure counts once", self.coalesced_failure),
+            ("Cancelled waiter keeps the shared call", self.waiter_cancel_keeps_shared_call),
+            ("Concurrency cap", self.concurrency_cap),
+        ]
+        for name, test in tests:
+            self.run_test(name, test)
+
+
+def main():
+    tester = LLMGuardTester()
+    tester.run_all_tests()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Final Results: {tester.tests_passed}/{tester.tests_run} tests passed")
+    if tester.tests_passed == tester.tests_run:
+        print("🎉 All tests passed!")
+        return 0
+    print(f"⚠️  {tester.tests_run - tester.tests_passed} tests failed")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,8 +3,12 @@
 # EcoReceipt Production Startup Script
 echo "🚀 Starting EcoReceipt Application..."
 
-# Start backend
-echo "📊 Starting Backend API..."
+# Start backend: a single worker process unless WEB_CONCURRENCY is set.
+# Each worker has its own Mongo pool (MONGO_MAX_POOL_SIZE connections) and its
+# own metrics, caches and profiles; run several with RATE_LIMIT_BACKEND=mongo.
+# Behind a reverse proxy on another host, set FORWARDED_ALLOW_IPS to its address.
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-1}
+echo "📊 Starting Backend API with $WEB_CONCURRENCY worker(s)..."
 cd /app/backend
 python server.py &
 